@@ -0,0 +1,83 @@
+"""
+Move old completed todos from `todos` into `todos_archive`
+
+Run periodically (e.g. from cron) from the backend directory:
+
+    python archive.py
+
+Rows are moved in bounded batches, each in its own short transaction, so the
+job can run while the API is serving traffic.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import select, insert, delete, literal
+from sqlalchemy.orm import Session
+import models
+from sharding import router
+
+load_dotenv()
+
+# Archive configuration
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVE_BATCH_PAUSE = float(os.getenv("ARCHIVE_BATCH_PAUSE", "0.05"))  # Seconds between batches
+
+TODO_COLUMNS = [column.name for column in models.Todo.__table__.columns]
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive one batch of todos completed before cutoff, returns the number of rows moved"""
+    todos = models.Todo.__table__
+
+    # Lock the batch so a concurrent update can't un-complete a row between
+    # the copy and the delete; rows locked by requests are picked up next run
+    ids = db.execute(
+        select(todos.c.id)
+        .where(todos.c.completed == True, todos.c.updated_at < cutoff)
+        .order_by(todos.c.updated_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    if not ids:
+        db.rollback()
+        return 0
+
+    db.execute(
+        insert(models.TodoArchive.__table__).from_select(
+            TODO_COLUMNS + ["archived_at"],
+            select(*[todos.c[name] for name in TODO_COLUMNS], literal(datetime.utcnow()))
+            .where(todos.c.id.in_(ids))
+        )
+    )
+    db.execute(delete(todos).where(todos.c.id.in_(ids)))
+    db.commit()
+
+    return len(ids)
+
+
+def archive_completed_todos(older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Archive all todos completed more than older_than_days ago, on every shard"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    total = 0
+
+    for shard in router.sessionmakers:
+        db = router.session(shard)
+        try:
+            while True:
+                moved = archive_batch(db, cutoff, batch_size)
+                total += moved
+                if moved < batch_size:
+                    break
+                time.sleep(ARCHIVE_BATCH_PAUSE)
+        finally:
+            db.close()
+
+    return total
+
+
+if __name__ == "__main__":
+    moved = archive_completed_todos()
+    print(f"Archived {moved} todos completed more than {ARCHIVE_AFTER_DAYS} days ago")
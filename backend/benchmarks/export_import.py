@@ -0,0 +1,64 @@
+"""
+Measure throughput and peak memory of todo import and export
+
+Imports a generated NDJSON file of N todos for a scratch user, exports them
+again in both formats and reports rows/s and the peak Python heap (tracemalloc)
+for each step. Run from the backend directory against a scratch database:
+
+    python -m benchmarks.export_import [rows]
+"""
+import sys
+import time
+import tempfile
+import tracemalloc
+import models
+import export_import
+from database import SessionLocal, engine
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+
+def measure(name, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<14} {rows:>9} rows {rows / elapsed:>10.0f} rows/s   peak heap {peak / 1024 / 1024:.1f} MiB")
+
+
+def write_ndjson(file):
+    for i in range(ROWS):
+        file.write(f'{{"title": "todo {i}", "description": "benchmark row {i}", "completed": {"true" if i % 2 else "false"}}}\n'.encode("utf-8"))
+    file.seek(0)
+
+
+def consume_export(user_id, fmt):
+    def run():
+        lines = 0
+        for chunk in export_import.iter_export(engine, user_id, fmt):
+            lines += chunk.count(b"\n")
+        return lines - (1 if fmt == "csv" else 0)
+    return run
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = models.User(username=f"bench-{time.time_ns()}", hashed_password="x")
+    db.add(user)
+    db.commit()
+    user_id = user.id
+
+    try:
+        with tempfile.TemporaryFile() as file:
+            write_ndjson(file)
+            measure("import ndjson", lambda: export_import.import_todos(db, user_id, file, "ndjson"))
+        measure("export ndjson", consume_export(user_id, "ndjson"))
+        measure("export csv", consume_export(user_id, "csv"))
+    finally:
+        db.query(models.Todo).filter(models.Todo.user_id == user_id).delete()
+        db.query(models.User).filter(models.User.id == user_id).delete()
+        db.commit()
+        db.close()
@@ -0,0 +1,40 @@
+"""
+Measure job runner throughput in jobs per second
+
+Enqueues N no-op jobs and runs the worker until the queue is drained. Run
+from the backend directory against a scratch database:
+
+    python -m benchmarks.jobs [jobs]
+"""
+import sys
+import time
+import asyncio
+import jobs
+from sharding import router
+
+JOBS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+
+@jobs.job_handler("benchmark.noop")
+def noop(index: int):
+    pass
+
+
+if __name__ == "__main__":
+    router.create_all()
+
+    db = router.session(next(iter(router.sessionmakers)))
+    started = time.perf_counter()
+    for i in range(JOBS):
+        jobs.enqueue(db, "benchmark.noop", index=i)
+        if i % 1000 == 999:
+            db.commit()
+    db.commit()
+    db.close()
+    elapsed = time.perf_counter() - started
+    print(f"enqueue  {JOBS / elapsed:>10.0f} jobs/s")
+
+    started = time.perf_counter()
+    processed = asyncio.run(jobs.run_worker(stop_when_empty=True))
+    elapsed = time.perf_counter() - started
+    print(f"process  {processed / elapsed:>10.0f} jobs/s")
@@ -0,0 +1,77 @@
+"""
+Compare VARCHAR(36) UUIDv4 keys with BINARY(16) UUIDv7 keys
+
+Creates two scratch copies of the todos layout in the configured database,
+inserts the same number of rows into each and reports insert throughput and
+the InnoDB index size. Run from the backend directory:
+
+    python -m benchmarks.uuid_storage [rows]
+"""
+import sys
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import Column, String, Boolean, DateTime, Text, MetaData, Table, Index, insert, text
+from database import engine
+from models import BinaryUUID, generate_uuid
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+BATCH_SIZE = 1000
+USERS = 1000
+
+
+def make_table(metadata, name, id_type):
+    return Table(
+        name, metadata,
+        Column("id", id_type, primary_key=True),
+        Column("title", String(255), nullable=False),
+        Column("description", Text),
+        Column("completed", Boolean, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        Column("user_id", id_type, nullable=False),
+        Index(f"ix_{name}_user_id", "user_id"),
+    )
+
+
+def run(table, new_id, user_ids):
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, ROWS, BATCH_SIZE):
+            conn.execute(insert(table), [
+                {
+                    "id": new_id(),
+                    "title": f"todo {i}",
+                    "description": None,
+                    "completed": False,
+                    "created_at": now,
+                    "user_id": user_ids[i % USERS],
+                }
+                for i in range(offset, min(offset + BATCH_SIZE, ROWS))
+            ])
+    elapsed = time.perf_counter() - started
+
+    index_size = None
+    if engine.dialect.name == "mysql":
+        with engine.connect() as conn:
+            conn.execute(text(f"ANALYZE TABLE {table.name}"))
+            index_size = conn.execute(text(
+                "SELECT DATA_LENGTH + INDEX_LENGTH FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"
+            ), {"name": table.name}).scalar()
+
+    size = f"{index_size / 1024 / 1024:.1f} MiB" if index_size is not None else "n/a"
+    print(f"{table.name:<16} {ROWS / elapsed:>10.0f} rows/s   data+index {size}")
+
+
+if __name__ == "__main__":
+    metadata = MetaData()
+    text_table = make_table(metadata, "bench_todos_str", String(36))
+    binary_table = make_table(metadata, "bench_todos_bin", BinaryUUID)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        run(text_table, lambda: str(uuid.uuid4()), [str(uuid.uuid4()) for _ in range(USERS)])
+        run(binary_table, generate_uuid, [generate_uuid() for _ in range(USERS)])
+    finally:
+        metadata.drop_all(engine)
@@ -0,0 +1,79 @@
+"""
+Check every budgeted route against its query budget
+
+Drives the API in-process against throwaway SQLite databases (a directory
+and two shards) and exits non-zero when a route runs more statements than
+QUERY_BUDGETS allows or repeats a statement. Run from the backend directory
+(CI runs it on every build):
+
+    python check_query_budgets.py
+
+The image routes need S3 and are skipped.
+"""
+import os
+import sys
+import tempfile
+
+DATA_DIR = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(DATA_DIR, "query_budgets.db"))
+# Two shards, so per-shard lookups show up as extra or repeated statements
+os.environ["DB_SHARDS"] = ",".join(f"s{i}=sqlite:///" + os.path.join(DATA_DIR, f"s{i}.db") for i in range(2))
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["QUERY_BUDGET_MODE"] = "off"  # Checked here instead of in the middleware
+
+from fastapi.testclient import TestClient
+import query_budget
+from main import app
+
+SKIPPED = {"POST /todos/{todo_id}/image", "DELETE /todos/{todo_id}/image"}
+TODO_COUNT = 5  # Enough todos to expose a per-row query
+
+
+def main() -> int:
+    failures = []
+    checked = set()
+
+    def call(key: str, method: str, url: str, expected_status: int = None, **kwargs):
+        with query_budget.count_queries() as stats:
+            response = client.request(method, url, **kwargs)
+        if response.status_code >= 400 and response.status_code != expected_status:
+            failures.append(f"{key}: HTTP {response.status_code} {response.text}")
+            return response
+        budget = query_budget.QUERY_BUDGETS[key]
+        problems = budget.check(stats)
+        print(f"{key}: {stats.count} queries (budget {budget.max_queries}), "
+              f"{stats.rows} rows (budget {budget.max_rows if budget.max_rows is not None else 'none'})")
+        failures.extend(f"{key}: {problem}" for problem in problems)
+        checked.add(key)
+        return response
+
+    with TestClient(app) as client:
+        credentials = {"username": "budgetcheck", "password": "budgetcheck"}
+        call("POST /auth/register", "POST", "/auth/register", json=credentials)
+        token = call("POST /auth/login", "POST", "/auth/login", json=credentials).json()["token"]
+        # Unknown usernames must not scan the shards within the budget
+        call("POST /auth/login", "POST", "/auth/login", expected_status=401,
+             json={"username": "nobody", "password": "budgetcheck"})
+        headers = {"Authorization": f"Bearer {token}"}
+
+        todo_ids = []
+        for i in range(TODO_COUNT):
+            response = call("POST /todos", "POST", "/todos", headers=headers, params={"title": f"Todo {i}"})
+            todo_ids.append(response.json()["id"])
+
+        call("GET /todos", "GET", "/todos", headers=headers)
+        call("GET /todos/export", "GET", "/todos/export", headers=headers)
+        call("GET /todos/{todo_id}", "GET", f"/todos/{todo_ids[0]}", headers=headers)
+        call("PUT /todos/{todo_id}", "PUT", f"/todos/{todo_ids[0]}", headers=headers, json={"completed": True})
+        call("DELETE /todos/{todo_id}", "DELETE", f"/todos/{todo_ids[0]}", headers=headers)
+
+    missing = set(query_budget.QUERY_BUDGETS) - SKIPPED - checked
+    failures.extend(f"{key}: not checked" for key in sorted(missing))
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
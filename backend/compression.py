@@ -0,0 +1,242 @@
+import os
+import time
+import zlib
+import asyncio
+from dotenv import load_dotenv
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+load_dotenv()
+
+# Compression configuration
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # Smaller bodies are sent as-is
+COMPRESSION_OFFLOAD_SIZE = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", "65536"))  # Larger chunks compress in a thread
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class GzipCompressor:
+    def __init__(self):
+        self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.flush()
+
+
+# Supported encodings in order of server preference
+COMPRESSORS = {}
+if zstandard is not None:
+    COMPRESSORS["zstd"] = ZstdCompressor
+if brotli is not None:
+    COMPRESSORS["br"] = BrotliCompressor
+COMPRESSORS["gzip"] = GzipCompressor
+
+
+class CompressionMetrics:
+    """Bytes saved versus CPU time spent, per encoding"""
+
+    def __init__(self):
+        self.stats = {}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float):
+        stats = self.stats.setdefault(encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0})
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        stats["cpu_seconds"] += cpu_seconds
+        stats["responses"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            encoding: {
+                **stats,
+                "bytes_saved": stats["bytes_in"] - stats["bytes_out"],
+                "ratio": round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None,
+            }
+            for encoding, stats in self.stats.items()
+        }
+
+
+metrics = CompressionMetrics()
+
+
+def select_encoding(accept_encoding: str):
+    """Pick the preferred encoding the client accepts, or None"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in COMPRESSORS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def timed_compress(compressor, data: bytes, final: bool = False) -> tuple[bytes, float]:
+    started = time.thread_time()
+    output = compressor.compress(data)
+    if final:
+        output += compressor.flush()
+    return output, time.thread_time() - started
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses responses with zstd, brotli or gzip
+
+    The encoding is negotiated from Accept-Encoding. Bodies are buffered only
+    until COMPRESSION_MIN_SIZE is reached, after which every chunk is
+    compressed and sent as it arrives, so streaming responses keep streaming.
+    Chunks above COMPRESSION_OFFLOAD_SIZE are compressed in a worker thread
+    to keep the event loop responsive.
+    """
+
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+
+        encoding = select_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await CompressedResponder(self.app, encoding, self.min_size)(scope, receive, send)
+
+
+class CompressedResponder:
+    """Per-request state of CompressionMiddleware"""
+
+    def __init__(self, app, encoding: str, min_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.min_size = min_size
+        self.send = None
+        self.start_message = None
+        self.buffer = []
+        self.buffered = 0
+        self.compressor = None
+        self.passthrough = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_wrapper)
+
+    async def send_wrapper(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = {name.lower(): value for name, value in message.get("headers", [])}
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            if b"content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                self.passthrough = True
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            self.buffer.append(body)
+            self.buffered += len(body)
+            if self.buffered < self.min_size:
+                if not more_body:
+                    # Too small to be worth it - send the original response
+                    await self.send(self.start_message)
+                    await self.send({"type": "http.response.body", "body": b"".join(self.buffer)})
+                return
+
+            self.compressor = COMPRESSORS[self.encoding]()
+            await self.send_compressed_start()
+            body = b"".join(self.buffer)
+            self.buffer = []
+
+        await self.send_compressed_body(body, more_body)
+
+    async def send_compressed_start(self):
+        headers = [
+            (name, value) for name, value in self.start_message.get("headers", [])
+            if name.lower() not in (b"content-length", b"vary")
+        ]
+        vary = [value for name, value in self.start_message.get("headers", []) if name.lower() == b"vary"]
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        await self.send({**self.start_message, "headers": headers})
+
+    async def send_compressed_body(self, body: bytes, more_body: bool):
+        final = not more_body
+        if len(body) >= COMPRESSION_OFFLOAD_SIZE:
+            output, cpu_seconds = await asyncio.to_thread(timed_compress, self.compressor, body, final)
+        else:
+            output, cpu_seconds = timed_compress(self.compressor, body, final)
+
+        self.bytes_in += len(body)
+        self.bytes_out += len(output)
+        self.cpu_seconds += cpu_seconds
+
+        if output or final:
+            await self.send({"type": "http.response.body", "body": output, "more_body": more_body})
+
+        if final:
+            metrics.record(self.encoding, self.bytes_in, self.bytes_out, self.cpu_seconds)
@@ -13,23 +13,31 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "3306")
 DB_NAME = os.getenv("DB_NAME", "tododb")
 
-SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL overrides the DB_* settings (e.g. sqlite:///./todo.db for checks in CI)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=3600
-)
+
+def create_db_engine(url: str):
+    connect_args = {}
+    if url.startswith("sqlite"):
+        # Sessions are used from FastAPI's threadpool
+        connect_args["check_same_thread"] = False
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        connect_args=connect_args
+    )
+
+
+# The DB_* database holds the user directory, and is the only shard
+# unless DB_SHARDS is set (see sharding.py)
+engine = create_db_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Tables stored on every shard
 Base = declarative_base()
 
-
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Tables stored only in the directory database
+DirectoryBase = declarative_base()
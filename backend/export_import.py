@@ -0,0 +1,182 @@
+"""
+Streaming export and import of a user's todos as NDJSON or CSV
+
+Both directions work on fixed-size batches so memory use stays flat no matter
+how many todos a user has.
+"""
+import os
+import io
+import csv
+import json
+from datetime import datetime, timezone
+from typing import Iterator, IO
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from sqlalchemy import select, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import models
+
+load_dotenv()
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+FIELDS = ["id", "title", "description", "completed", "imageUrl", "createdAt", "updatedAt"]
+
+EXPORT_COLUMNS = ["id", "title", "description", "completed", "image_url", "created_at", "updated_at"]
+
+
+def invalid_format_error(fmt: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail={
+            "error": {
+                "code": "INVALID_FORMAT",
+                "message": f"Format {fmt} not supported. Supported formats: {', '.join(FORMATS)}"
+            }
+        }
+    )
+
+
+def iter_export(engine: Engine, user_id: str, fmt: str) -> Iterator[bytes]:
+    """
+    Yield a user's todos in chunks of EXPORT_BATCH_SIZE rows
+
+    Live todos come first, then archived ones. Uses its own connection to the
+    user's shard with a server-side cursor, since the request's session is
+    closed before a streaming response body is sent.
+    """
+    with engine.connect() as conn:
+        batches = iter_export_batches(conn, user_id)
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(FIELDS)
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            for rows in batches:
+                for row in rows:
+                    writer.writerow([
+                        row.id, row.title, row.description or "", int(row.completed), row.image_url or "",
+                        row.created_at.isoformat(), row.updated_at.isoformat() if row.updated_at else "",
+                    ])
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        else:
+            for rows in batches:
+                yield "".join(
+                    json.dumps({
+                        "id": row.id,
+                        "title": row.title,
+                        "description": row.description,
+                        "completed": row.completed,
+                        "imageUrl": row.image_url,
+                        "createdAt": row.created_at.isoformat(),
+                        "updatedAt": row.updated_at.isoformat() if row.updated_at else None,
+                    }) + "\n"
+                    for row in rows
+                ).encode("utf-8")
+
+
+def iter_export_batches(conn, user_id: str) -> Iterator[list]:
+    for table in (models.Todo.__table__, models.TodoArchive.__table__):
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE).execute(
+            select(*[table.c[name] for name in EXPORT_COLUMNS])
+            .where(table.c.user_id == user_id)
+            .order_by(table.c.created_at)
+        )
+        yield from result.partitions()
+
+
+def iter_import_records(file: IO[bytes], fmt: str) -> Iterator[dict]:
+    """Parse an uploaded file one record at a time"""
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="" if fmt == "csv" else None)
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+    else:
+        for line in text:
+            if line.strip():
+                yield json.loads(line)
+
+
+def parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    if value is None or isinstance(value, (bool, int)):
+        return bool(value)
+    raise ValueError("completed must be a boolean")
+
+
+def to_row(record: dict, user_id: str, now: datetime) -> dict:
+    """Validate an imported record and map it to `todos` columns"""
+    title = record.get("title")
+    if not isinstance(title, str) or not 1 <= len(title) <= 255:
+        raise ValueError("title must be between 1 and 255 characters")
+
+    description = record.get("description")
+    if description is not None and not isinstance(description, str):
+        raise ValueError("description must be a string")
+
+    created_at = now
+    if record.get("createdAt"):
+        created_at = datetime.fromisoformat(record["createdAt"])
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return {
+        "title": title,
+        "description": description or None,
+        "completed": parse_bool(record.get("completed", False)),
+        "created_at": created_at,
+        "updated_at": now,
+        "user_id": user_id,
+    }
+
+
+def import_todos(db: Session, user_id: str, file: IO[bytes], fmt: str) -> int:
+    """
+    Insert todos from an uploaded file in batches of IMPORT_BATCH_SIZE
+
+    The whole import runs in one transaction, so a bad record leaves the
+    user's todos untouched. Returns the number of imported todos.
+    """
+    table = models.Todo.__table__
+    now = datetime.utcnow()
+    batch = []
+    imported = 0
+    position = 1  # Record being parsed, for error messages
+
+    try:
+        for record in iter_import_records(file, fmt):
+            batch.append(to_row(record, user_id, now))
+            position += 1
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                db.execute(insert(table), batch)
+                imported += len(batch)
+                batch = []
+        if batch:
+            db.execute(insert(table), batch)
+            imported += len(batch)
+    except (ValueError, TypeError, AttributeError, UnicodeDecodeError) as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": {
+                    "code": "INVALID_IMPORT_RECORD",
+                    "message": f"Record {position}: {e}"
+                }
+            }
+        )
+
+    db.commit()
+    return imported
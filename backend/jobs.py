@@ -0,0 +1,241 @@
+"""
+Transactional outbox and background job runner
+
+Request handlers call `enqueue()` before `db.commit()`, so a job exists if
+and only if the change that caused it was committed. The worker claims
+pending jobs in batches with SELECT ... FOR UPDATE SKIP LOCKED, so several
+workers can run side by side, and retries failures with exponential backoff.
+
+Run the worker from the backend directory:
+
+    python jobs.py
+"""
+import os
+import time
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable
+from dotenv import load_dotenv
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.orm import Session
+import models
+from sharding import router
+from s3_utils import delete_file_from_s3
+
+load_dotenv()
+
+# Job worker configuration
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "50"))
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "10"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # Seconds to wait when the queue is empty
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "8"))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "2.0"))  # Seconds, doubled on every attempt
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "3600"))
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "300"))  # Reclaim jobs of crashed workers after this
+JOB_WORKER_PROCESSES = int(os.getenv("JOB_WORKER_PROCESSES", "0"))  # 0 runs handlers in threads
+JOB_STATS_INTERVAL = float(os.getenv("JOB_STATS_INTERVAL", "60"))
+
+HANDLERS = {}
+
+
+def job_handler(kind: str):
+    """Register a function as the handler for a job kind"""
+    def decorator(handler: Callable):
+        HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def enqueue(db: Session, kind: str, **payload) -> models.Job:
+    """Add a job to the session; it is committed together with the caller's changes"""
+    if kind not in HANDLERS:
+        raise ValueError(f"No handler registered for job kind {kind}")
+    job = models.Job(kind=kind, payload=payload)
+    db.add(job)
+    return job
+
+
+@job_handler("s3.delete_object")
+def delete_s3_object(bucket_name: str, file_key: str):
+    if not delete_file_from_s3(bucket_name, file_key):
+        raise RuntimeError(f"Failed to delete {file_key} from {bucket_name}")
+
+
+def claim_jobs(shard: str, batch_size: int = JOB_BATCH_SIZE) -> list[tuple]:
+    """
+    Mark a batch of due jobs on a shard as running
+
+    Returns (id, kind, payload, attempts, locked_at) tuples; locked_at
+    identifies this claim when the results are written back.
+    """
+    jobs = models.Job.__table__
+    now = datetime.utcnow()
+    # locked_at is a DATETIME without fractions, it must compare equal later
+    locked_at = now.replace(microsecond=0)
+    db = router.session(shard)
+    try:
+        rows = db.execute(
+            select(jobs.c.id, jobs.c.kind, jobs.c.payload, jobs.c.attempts, jobs.c.status)
+            .where(
+                ((jobs.c.status == "pending") & (jobs.c.run_after <= now))
+                | ((jobs.c.status == "running") & (jobs.c.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT)))
+            )
+            .order_by(jobs.c.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        claimed, pending, reclaimed, abandoned = [], [], [], []
+        for row in rows:
+            attempts = row.attempts
+            if row.status == "running":
+                # The worker that claimed the job crashed or hung in its
+                # handler, which counts as a failed attempt
+                attempts += 1
+                if attempts >= JOB_MAX_ATTEMPTS:
+                    abandoned.append(row.id)
+                    continue
+                reclaimed.append(row.id)
+            else:
+                pending.append(row.id)
+            claimed.append((row.id, row.kind, row.payload, attempts, locked_at))
+
+        if pending:
+            db.execute(update(jobs).where(jobs.c.id.in_(pending)).values(status="running", locked_at=locked_at))
+        if reclaimed:
+            db.execute(
+                update(jobs)
+                .where(jobs.c.id.in_(reclaimed))
+                .values(status="running", locked_at=locked_at, attempts=jobs.c.attempts + 1)
+            )
+        if abandoned:
+            db.execute(
+                update(jobs)
+                .where(jobs.c.id.in_(abandoned))
+                .values(
+                    status="failed",
+                    attempts=jobs.c.attempts + 1,
+                    locked_at=None,
+                    last_error=f"Not finished within {JOB_LOCK_TIMEOUT} seconds"
+                )
+            )
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+
+def finish_jobs(shard: str, results: list[tuple]):
+    """
+    Delete succeeded jobs and reschedule (or give up on) failed ones
+
+    Only jobs still held by the claim that ran them are touched. A job that
+    took longer than JOB_LOCK_TIMEOUT may have been reclaimed by another
+    worker in the meantime, and its result then belongs to that worker.
+    """
+    jobs = models.Job.__table__
+    done = {}  # locked_at -> ids, one claim per batch
+    for job_id, _, locked_at, error in results:
+        if error is None:
+            done.setdefault(locked_at, []).append(job_id)
+    db = router.session(shard)
+    try:
+        for locked_at, job_ids in done.items():
+            db.execute(
+                delete(jobs)
+                .where(jobs.c.id.in_(job_ids), jobs.c.status == "running", jobs.c.locked_at == locked_at)
+            )
+
+        now = datetime.utcnow()
+        for job_id, attempts, locked_at, error in results:
+            if error is None:
+                continue
+            attempts += 1
+            delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+            db.execute(
+                update(jobs)
+                .where(jobs.c.id == job_id, jobs.c.status == "running", jobs.c.locked_at == locked_at)
+                .values(
+                    status="failed" if attempts >= JOB_MAX_ATTEMPTS else "pending",
+                    attempts=attempts,
+                    run_after=now + timedelta(seconds=delay),
+                    locked_at=None,
+                    last_error=error[:2000]
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def queue_stats() -> dict:
+    """Number of jobs per status, summed over all shards"""
+    stats = {"pending": 0, "running": 0, "failed": 0}
+    for shard in router.sessionmakers:
+        db = router.session(shard)
+        try:
+            rows = db.execute(select(models.Job.status, func.count()).group_by(models.Job.status)).all()
+        finally:
+            db.close()
+        for status, count in rows:
+            stats[status] = stats.get(status, 0) + count
+    return stats
+
+
+async def run_job(job: tuple, executor, semaphore: asyncio.Semaphore) -> tuple:
+    """Run one job, returns (id, attempts, locked_at, error)"""
+    job_id, kind, payload, attempts, locked_at = job
+    async with semaphore:
+        try:
+            handler = HANDLERS[kind]
+            if asyncio.iscoroutinefunction(handler):
+                await handler(**payload)
+            else:
+                await asyncio.get_running_loop().run_in_executor(executor, functools.partial(handler, **payload))
+            return job_id, attempts, locked_at, None
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e}")
+            return job_id, attempts, locked_at, f"{type(e).__name__}: {e}"
+
+
+async def run_worker(batch_size: int = JOB_BATCH_SIZE, concurrency: int = JOB_CONCURRENCY, stop_when_empty: bool = False) -> int:
+    """Process jobs until stopped (or until the queue is empty), returns the number of jobs run"""
+    executor = ProcessPoolExecutor(JOB_WORKER_PROCESSES) if JOB_WORKER_PROCESSES > 0 else None
+    semaphore = asyncio.Semaphore(concurrency)
+    processed = 0
+    window_start, window_processed = time.monotonic(), 0
+
+    try:
+        while True:
+            claimed = 0
+            for shard in router.sessionmakers:
+                batch = await asyncio.to_thread(claim_jobs, shard, batch_size)
+                if batch:
+                    results = await asyncio.gather(*(run_job(job, executor, semaphore) for job in batch))
+                    await asyncio.to_thread(finish_jobs, shard, results)
+                    claimed += len(results)
+
+            processed += claimed
+            window_processed += claimed
+            if not claimed:
+                if stop_when_empty:
+                    break
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+            elapsed = time.monotonic() - window_start
+            if elapsed >= JOB_STATS_INTERVAL:
+                stats = await asyncio.to_thread(queue_stats)
+                print(f"Jobs: {window_processed / elapsed:.1f}/s, queue depth {stats}")
+                window_start, window_processed = time.monotonic(), 0
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return processed
+
+
+if __name__ == "__main__":
+    router.create_all()
+    asyncio.run(run_worker())
@@ -1,23 +1,42 @@
 from fastapi import FastAPI, Depends, HTTPException, status, Query, File, UploadFile
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from typing import Optional, List
 import models
 import schemas
 import auth
 import os
-from database import engine, get_db
+from sharding import router, get_directory_db, UserMovingError
 from datetime import datetime
 import io
-from s3_utils import upload_file_to_s3, delete_file_from_s3
+from s3_utils import upload_file_to_s3
+from rate_limit import RateLimitMiddleware, RATE_LIMIT_ENABLED
+import export_import
+import jobs
+import compression
+import query_budget
+import pagination
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# Create database tables on every shard and in the directory
+router.create_all()
 
 app = FastAPI(title="Todo API", version="1.0.0")
 security = HTTPBearer()
 
+# Add rate limiting / admission control before CORS so that CORS stays the
+# outermost middleware and 429/503 responses still carry CORS headers
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
+# Count SQL statements per request and check them against QUERY_BUDGETS
+app.add_middleware(query_budget.QueryBudgetMiddleware)
+
+# Compress large responses (wraps the rate limiter, wrapped by CORS)
+app.add_middleware(compression.CompressionMiddleware)
+
 # Add CORS middleware to allow all origins
 app.add_middleware(
     CORSMiddleware,
@@ -25,14 +44,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods (GET, POST, PUT, DELETE, etc.)
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["Retry-After"],  # Let browser clients back off on 429/503
 )
 
 
-# Dependency to get current user from token
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
+# Dependency to decode the bearer token
+async def get_token_payload(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = auth.verify_token(token)
     if not payload:
@@ -45,7 +62,48 @@ async def get_current_user(
                 }
             }
         )
+    return payload
+
+
+# Dependency to get a database session on the shard holding the current user's data
+def get_db(payload: dict = Depends(get_token_payload)):
+    try:
+        shard = router.shard_for_user(payload.get("user_id"))
+    except UserMovingError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "error": {
+                    "code": "USER_MIGRATING",
+                    "message": "Account is being migrated, please retry shortly"
+                }
+            },
+            headers={"Retry-After": "5"}
+        )
+    
+    if shard is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail={
+                "error": {
+                    "code": "INVALID_TOKEN",
+                    "message": "User not found"
+                }
+            }
+        )
     
+    db = router.session(shard)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Dependency to get current user from token
+async def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    db: Session = Depends(get_db)
+):
     user = db.query(models.User).filter(models.User.id == payload.get("user_id")).first()
     if not user:
         raise HTTPException(
@@ -65,12 +123,19 @@ async def root():
     return {"message": "Todo API is running"}
 
 
+@app.get("/metrics/compression")
+async def compression_metrics():
+    return compression.metrics.snapshot()
+
+
 # Authentication Endpoints
 @app.post("/auth/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
-    # Check if username exists
-    existing_user = db.query(models.User).filter(models.User.username == user_data.username).first()
-    if existing_user:
+async def register(user_data: schemas.UserCreate, directory: Session = Depends(get_directory_db)):
+    # Check if username exists, also among users not yet in the directory
+    existing_user = directory.query(models.UserDirectory).filter(
+        models.UserDirectory.username == user_data.username
+    ).first()
+    if existing_user or router.backfill_directory(username=user_data.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail={
@@ -81,27 +146,92 @@ async def register(user_data: schemas.UserCreate, db: Session = Depends(get_db))
             }
         )
     
-    # Create new user
+    # Claim the username in the directory, which also picks the user's shard
+    user_id = models.generate_uuid()
+    shard = router.place(user_id)
+    entry = models.UserDirectory(username=user_data.username, user_id=user_id, shard=shard)
+    directory.add(entry)
+    try:
+        directory.commit()
+    except IntegrityError:
+        directory.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "error": {
+                    "code": "USERNAME_EXISTS",
+                    "message": "Username already taken"
+                }
+            }
+        )
+    
+    # Create new user on its shard
     hashed_password = auth.get_password_hash(user_data.password)
-    new_user = models.User(username=user_data.username, hashed_password=hashed_password)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    db = router.session(shard)
+    try:
+        new_user = models.User(id=user_id, username=user_data.username, hashed_password=hashed_password)
+        db.add(new_user)
+        db.commit()
+    except Exception as e:
+        # Release the username again
+        db.rollback()
+        directory.delete(entry)
+        directory.commit()
+        if isinstance(e, IntegrityError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "error": {
+                        "code": "USERNAME_EXISTS",
+                        "message": "Username already taken"
+                    }
+                }
+            )
+        raise
+    finally:
+        db.close()
     
     # Generate token
-    token = auth.create_access_token({"user_id": new_user.id})
+    token = auth.create_access_token({"user_id": user_id})
     
     return schemas.UserResponse(
-        id=str(new_user.id),
-        username=new_user.username,
+        id=user_id,
+        username=user_data.username,
         token=token
     )
 
 
 @app.post("/auth/login", response_model=schemas.UserResponse)
-async def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    # Find user
-    user = db.query(models.User).filter(models.User.username == user_data.username).first()
+async def login(user_data: schemas.UserLogin, directory: Session = Depends(get_directory_db)):
+    # Find user through the directory
+    entry = directory.query(models.UserDirectory).filter(
+        models.UserDirectory.username == user_data.username
+    ).first()
+    if entry is None and router.backfill_directory(username=user_data.username):
+        with query_budget.uncounted():
+            entry = directory.query(models.UserDirectory).filter(
+                models.UserDirectory.username == user_data.username
+            ).first()
+    
+    if entry and entry.moving:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "error": {
+                    "code": "USER_MIGRATING",
+                    "message": "Account is being migrated, please retry shortly"
+                }
+            },
+            headers={"Retry-After": "5"}
+        )
+    
+    user = None
+    if entry:
+        db = router.session(entry.shard)
+        try:
+            user = db.query(models.User).filter(models.User.id == entry.user_id).first()
+        finally:
+            db.close()
     
     if not user or not auth.verify_password(user_data.password, user.hashed_password):
         raise HTTPException(
@@ -130,32 +260,98 @@ async def get_todos(
     status_filter: Optional[str] = Query(None, alias="status"),
     sort: Optional[str] = Query("createdAt"),
     order: Optional[str] = Query("desc"),
+    include_archived: bool = Query(False),
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Todo).filter(models.Todo.user_id == current_user.id)
+    after = None
+    if cursor is not None:
+        after = pagination.decode_cursor(cursor)
+        if after is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "error": {
+                        "code": "INVALID_CURSOR",
+                        "message": "Cursor is malformed, start again without one"
+                    }
+                }
+            )
     
-    # Filter by status
-    if status_filter == "completed":
-        query = query.filter(models.Todo.completed == True)
-    elif status_filter == "pending":
-        query = query.filter(models.Todo.completed == False)
+    descending = order != "asc"
     
-    # Sort
-    if sort == "createdAt":
-        if order == "asc":
-            query = query.order_by(models.Todo.created_at.asc())
-        else:
-            query = query.order_by(models.Todo.created_at.desc())
+    def list_query(model):
+        query = db.query(model).filter(model.user_id == current_user.id)
+        
+        # Filter by status
+        if status_filter == "completed":
+            query = query.filter(model.completed == True)
+        elif status_filter == "pending":
+            query = query.filter(model.completed == False)
+        
+        # Sort (createdAt is the only supported key; id breaks ties so pages are stable)
+        query = query.order_by(*pagination.order_by(model, descending))
+        
+        if after is not None:
+            query = query.filter(pagination.after_cursor(model, after, descending))
+        if limit is not None:
+            # One extra row tells whether there is a next page
+            query = query.limit(limit + 1)
+        return query
     
-    todos = query.all()
+    todos = list_query(models.Todo).all()
+    
+    # Read through to the archive (it only holds completed todos)
+    if include_archived and status_filter != "pending":
+        todos.extend(list_query(models.TodoArchive).all())
+        todos.sort(key=pagination.sort_key, reverse=descending)
+    
+    next_cursor = None
+    if limit is not None and len(todos) > limit:
+        todos = todos[:limit]
+        next_cursor = pagination.encode_cursor(todos[-1])
     
     return schemas.TodoListResponse(
         todos=[schemas.TodoResponse.from_orm(todo) for todo in todos],
-        total=len(todos)
+        total=len(todos),
+        nextCursor=next_cursor
+    )
+
+
+@app.get("/todos/export")
+async def export_todos(
+    format: str = Query("ndjson"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if format not in export_import.FORMATS:
+        raise export_import.invalid_format_error(format)
+    
+    return StreamingResponse(
+        export_import.iter_export(db.get_bind(), current_user.id, format),
+        media_type=export_import.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="todos.{format}"'}
     )
 
 
+# Plain def so FastAPI runs the (potentially long) import in the threadpool
+@app.post("/todos/import", response_model=schemas.TodoImportResponse, status_code=status.HTTP_201_CREATED)
+def import_todos(
+    file: UploadFile = File(...),
+    format: str = Query("ndjson"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if format not in export_import.FORMATS:
+        raise export_import.invalid_format_error(format)
+    
+    imported = export_import.import_todos(db, current_user.id, file.file, format)
+    
+    return schemas.TodoImportResponse(imported=imported)
+
+
 @app.get("/todos/{todo_id}", response_model=schemas.TodoResponse)
 async def get_todo(
     todo_id: str,
@@ -164,6 +360,10 @@ async def get_todo(
 ):
     todo = db.query(models.Todo).filter(models.Todo.id == todo_id).first()
     
+    # Fall back to the archive for old completed todos
+    if not todo:
+        todo = db.query(models.TodoArchive).filter(models.TodoArchive.id == todo_id).first()
+    
     if not todo:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -205,7 +405,6 @@ async def create_todo(
     )
     db.add(new_todo)
     db.commit()
-    db.refresh(new_todo)
     
     # If an image was provided, upload it to S3
     if image is not None:
@@ -235,7 +434,6 @@ async def create_todo(
         new_todo.image_url = file_url
         new_todo.image_key = file_key
         db.commit()
-        db.refresh(new_todo)
     
     return schemas.TodoResponse.from_orm(new_todo)
 
@@ -282,7 +480,6 @@ async def update_todo(
     todo.updated_at = datetime.utcnow()
     
     db.commit()
-    db.refresh(todo)
     
     return schemas.TodoResponse.from_orm(todo)
 
@@ -295,6 +492,10 @@ async def delete_todo(
 ):
     todo = db.query(models.Todo).filter(models.Todo.id == todo_id).first()
     
+    # Fall back to the archive for old completed todos
+    if not todo:
+        todo = db.query(models.TodoArchive).filter(models.TodoArchive.id == todo_id).first()
+    
     if not todo:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -317,9 +518,9 @@ async def delete_todo(
             }
         )
     
-    # If the todo has an associated image, delete it from S3
+    # If the todo has an associated image, delete it from S3 once the delete is committed
     if todo.image_key:
-        delete_file_from_s3(os.getenv("S3_BUCKET_NAME"), todo.image_key)
+        jobs.enqueue(db, "s3.delete_object", bucket_name=os.getenv("S3_BUCKET_NAME"), file_key=todo.image_key)
     
     db.delete(todo)
     db.commit()
@@ -398,7 +599,6 @@ async def upload_todo_image(
     todo.updated_at = datetime.utcnow()
     
     db.commit()
-    db.refresh(todo)
     
     return schemas.TodoResponse.from_orm(todo)
 
@@ -411,6 +611,10 @@ async def delete_todo_image(
 ):
     todo = db.query(models.Todo).filter(models.Todo.id == todo_id).first()
     
+    # Fall back to the archive for old completed todos
+    if not todo:
+        todo = db.query(models.TodoArchive).filter(models.TodoArchive.id == todo_id).first()
+    
     if not todo:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -445,18 +649,8 @@ async def delete_todo_image(
             }
         )
     
-    # Delete the image from S3
-    success = delete_file_from_s3(os.getenv("S3_BUCKET_NAME"), todo.image_key)
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail={
-                "error": {
-                    "code": "DELETE_FAILED",
-                    "message": "Failed to delete image from storage"
-                }
-            }
-        )
+    # Delete the image from S3 in the background, retried until it succeeds
+    jobs.enqueue(db, "s3.delete_object", bucket_name=os.getenv("S3_BUCKET_NAME"), file_key=todo.image_key)
     
     # Update the todo to remove image information
     todo.image_url = None
@@ -464,6 +658,5 @@ async def delete_todo_image(
     todo.updated_at = datetime.utcnow()
     
     db.commit()
-    db.refresh(todo)
     
     return schemas.TodoResponse.from_orm(todo)
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+Add indexes on `todos` introduced after the table was first created
+
+`create_all()` and db/init.sql only create indexes together with a new
+table, so existing databases need this once. Run from the backend directory:
+
+    python -m migrations.add_todo_indexes
+
+Runs against every shard. Indexes that already exist are skipped, and
+indexes made redundant by a new one are dropped after it exists (so the
+foreign key on user_id is never left without an index). On MySQL 8 adding a
+secondary index is an online operation, so the API keeps serving traffic.
+"""
+from sqlalchemy import inspect, text
+import models
+from sharding import router
+
+# New index -> older indexes it makes redundant
+INDEXES = {
+    "idx_todos_user_created": ["idx_todos_user_id"],  # Keyset paging of GET /todos
+    "idx_todos_completed_updated": ["idx_todos_completed"],  # archive.py batches
+}
+
+
+def migrate(shard_engine) -> list[str]:
+    existing = {index["name"] for index in inspect(shard_engine).get_indexes("todos")}
+    changes = []
+    with shard_engine.begin() as conn:
+        for index in models.Todo.__table__.indexes:
+            if index.name in INDEXES and index.name not in existing:
+                index.create(bind=conn)
+                changes.append(f"created {index.name}")
+
+        for redundant in [name for names in INDEXES.values() for name in names]:
+            if redundant in existing:
+                if conn.dialect.name == "mysql":
+                    conn.execute(text(f"DROP INDEX {redundant} ON todos"))
+                else:
+                    conn.execute(text(f"DROP INDEX {redundant}"))
+                changes.append(f"dropped {redundant}")
+    return changes
+
+
+if __name__ == "__main__":
+    for shard, shard_engine in router.engines.items():
+        changes = migrate(shard_engine)
+        print(f"{shard}: {', '.join(changes) if changes else 'up to date'}")
+    print("Done")
@@ -0,0 +1,202 @@
+"""
+Migration of users/todos ids from VARCHAR(36) to BINARY(16)
+
+Requires MySQL 8.0.29+ (UUID_TO_BIN, instant DROP/RENAME COLUMN). Run from
+the backend directory, one step at a time:
+
+    python -m migrations.uuid_to_binary prepare   # add shadow columns + triggers
+    python -m migrations.uuid_to_binary backfill  # copy existing rows in batches
+    python -m migrations.uuid_to_binary rekey     # rebuild tables around the shadow columns
+    python -m migrations.uuid_to_binary cutover   # swap columns (maintenance window)
+
+`prepare`, `backfill` and `rekey` run while the old code keeps serving
+traffic. The triggers fill the shadow columns for rows written in the
+meantime, the backfill only holds row locks for one batch at a time, and
+`rekey` moves the primary keys to the shadow columns with an online table
+rebuild (ALGORITHM=INPLACE, LOCK=NONE) while keeping a unique index on the
+old ids for the old code. The triggers stay in place throughout.
+
+`rekey` checks information_schema before each change, so it can be re-run
+after a failure. If migrations.add_todo_indexes already created
+idx_todos_user_created on the old VARCHAR user_id, that index is kept as
+idx_todos_user_created_legacy (the foreign key still needs it) until
+`cutover` drops it.
+
+Every step runs against every shard (see sharding.py); without DB_SHARDS
+that is the one database configured with DB_*. A separate directory
+database doesn't need migrating, its user_directory table was created with
+BINARY(16) ids.
+
+`cutover` needs a short maintenance window, since the old code can't write
+to BINARY(16) columns and the new code can't write to VARCHAR(36) ones:
+stop the old API and the job worker, run `cutover`, then deploy the new
+image. `cutover` only changes metadata (dropping the triggers, the old
+columns and their indexes, renaming the shadow columns), so it takes seconds
+regardless of table size.
+"""
+import sys
+import time
+from sqlalchemy import text
+from sharding import router
+
+BATCH_SIZE = 1000
+
+PREPARE = [
+    "ALTER TABLE users ADD COLUMN id_bin BINARY(16) NULL, ALGORITHM=INPLACE, LOCK=NONE",
+    "ALTER TABLE todos ADD COLUMN id_bin BINARY(16) NULL, ADD COLUMN user_id_bin BINARY(16) NULL, "
+    "ALGORITHM=INPLACE, LOCK=NONE",
+    """CREATE TRIGGER users_id_bin_insert BEFORE INSERT ON users FOR EACH ROW
+       SET NEW.id_bin = UUID_TO_BIN(NEW.id)""",
+    """CREATE TRIGGER todos_id_bin_insert BEFORE INSERT ON todos FOR EACH ROW
+       SET NEW.id_bin = UUID_TO_BIN(NEW.id), NEW.user_id_bin = UUID_TO_BIN(NEW.user_id)""",
+]
+
+BACKFILL = [
+    "UPDATE users SET id_bin = UUID_TO_BIN(id) WHERE id_bin IS NULL LIMIT :batch",
+    "UPDATE todos SET id_bin = UUID_TO_BIN(id), user_id_bin = UUID_TO_BIN(user_id) "
+    "WHERE id_bin IS NULL LIMIT :batch",
+]
+
+# (table, index, columns once done, statement); a statement is skipped when
+# the index already has those columns
+REKEY = [
+    # Keep the old ids indexed for the old code (and the foreign key) before
+    # moving the primary keys off them
+    ("users", "uq_users_legacy_id", ["id"],
+     "ALTER TABLE users ADD UNIQUE KEY uq_users_legacy_id (id), ALGORITHM=INPLACE, LOCK=NONE"),
+    ("todos", "uq_todos_legacy_id", ["id"],
+     "ALTER TABLE todos ADD UNIQUE KEY uq_todos_legacy_id (id), ALGORITHM=INPLACE, LOCK=NONE"),
+    ("users", "PRIMARY", ["id_bin"],
+     """ALTER TABLE users
+        MODIFY id_bin BINARY(16) NOT NULL,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (id_bin),
+        ALGORITHM=INPLACE, LOCK=NONE"""),
+    ("todos", "PRIMARY", ["id_bin"],
+     """ALTER TABLE todos
+        MODIFY id_bin BINARY(16) NOT NULL,
+        MODIFY user_id_bin BINARY(16) NOT NULL,
+        DROP PRIMARY KEY,
+        ADD PRIMARY KEY (id_bin),
+        ALGORITHM=INPLACE, LOCK=NONE"""),
+    ("todos", "idx_todos_user_created", ["user_id_bin", "created_at"],
+     "ALTER TABLE todos ADD INDEX idx_todos_user_created (user_id_bin, created_at), ALGORITHM=INPLACE, LOCK=NONE"),
+]
+
+CUTOVER = [
+    "DROP TRIGGER IF EXISTS users_id_bin_insert",
+    "DROP TRIGGER IF EXISTS todos_id_bin_insert",
+    "SET foreign_key_checks = 0",
+    # Columns can only be dropped instantly once no index uses them
+    "ALTER TABLE todos DROP FOREIGN KEY {todos_fk}, {todos_drop_indexes}, ALGORITHM=INPLACE",
+    "ALTER TABLE users {users_drop_indexes}, ALGORITHM=INPLACE",
+    """ALTER TABLE todos
+       DROP COLUMN id,
+       DROP COLUMN user_id,
+       RENAME COLUMN id_bin TO id,
+       RENAME COLUMN user_id_bin TO user_id,
+       ALGORITHM=INSTANT""",
+    """ALTER TABLE users
+       DROP COLUMN id,
+       RENAME COLUMN id_bin TO id,
+       ALGORITHM=INSTANT""",
+    "ALTER TABLE todos ADD CONSTRAINT todos_user_id_fk FOREIGN KEY (user_id) REFERENCES users(id) "
+    "ON DELETE CASCADE, ALGORITHM=INPLACE",
+    "SET foreign_key_checks = 1",
+]
+
+
+def prepare(conn):
+    for statement in PREPARE:
+        conn.execute(text(statement))
+
+
+def backfill(conn):
+    for statement in BACKFILL:
+        total = 0
+        while True:
+            result = conn.execute(text(statement), {"batch": BATCH_SIZE})
+            conn.commit()
+            total += result.rowcount
+            if result.rowcount < BATCH_SIZE:
+                break
+            time.sleep(0.01)  # Give replication and foreground queries some room
+        print(f"{statement.split()[1]}: backfilled {total} rows")
+
+
+def index_columns(conn, table: str, index: str) -> list[str]:
+    return conn.execute(text(
+        "SELECT COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_NAME = :index "
+        "ORDER BY SEQ_IN_INDEX"
+    ), {"table": table, "index": index}).scalars().all()
+
+
+def rekey(conn):
+    remaining = conn.execute(text(
+        "SELECT (SELECT COUNT(*) FROM users WHERE id_bin IS NULL) + "
+        "(SELECT COUNT(*) FROM todos WHERE id_bin IS NULL OR user_id_bin IS NULL)"
+    )).scalar()
+    if remaining:
+        print(f"{remaining} rows are not backfilled yet, run 'backfill' first")
+        sys.exit(1)
+
+    for table, index, columns, statement in REKEY:
+        existing = index_columns(conn, table, index)
+        if existing == columns:
+            print(f"{table}.{index}: already done")
+            continue
+        if existing and index != "PRIMARY":
+            # Same name on the old columns: keep it under another name for
+            # the old code and the foreign key, cutover drops it
+            conn.execute(text(
+                f"ALTER TABLE {table} RENAME INDEX {index} TO {index}_legacy, ALGORITHM=INPLACE, LOCK=NONE"
+            ))
+        conn.execute(text(statement))
+
+
+def cutover(conn):
+    version = conn.execute(text("SELECT VERSION()")).scalar()
+    if tuple(int(part) for part in version.split("-")[0].split(".")[:3]) < (8, 0, 29):
+        print(f"MySQL {version} can't drop columns instantly, 8.0.29 or later is required")
+        sys.exit(1)
+
+    primary_key = conn.execute(text(
+        "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'todos' AND CONSTRAINT_NAME = 'PRIMARY'"
+    )).scalar()
+    if primary_key != "id_bin":
+        print("The primary keys haven't been moved yet, run 'rekey' first")
+        sys.exit(1)
+
+    todos_fk = conn.execute(text(
+        "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'todos' AND REFERENCED_TABLE_NAME = 'users'"
+    )).scalar()
+    drop_indexes = {}
+    for table in ("users", "todos"):
+        names = conn.execute(text(
+            "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+            "AND COLUMN_NAME IN ('id', 'user_id') AND INDEX_NAME != 'PRIMARY'"
+        ), {"table": table}).scalars().all()
+        drop_indexes[f"{table}_drop_indexes"] = ", ".join(f"DROP INDEX {name}" for name in names)
+
+    for statement in CUTOVER:
+        conn.execute(text(statement.format(todos_fk=todos_fk, **drop_indexes)))
+
+
+STEPS = {"prepare": prepare, "backfill": backfill, "rekey": rekey, "cutover": cutover}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in STEPS:
+        print(f"Usage: python -m migrations.uuid_to_binary [{'|'.join(STEPS)}]")
+        sys.exit(1)
+
+    for shard, shard_engine in router.engines.items():
+        print(f"{shard}: {sys.argv[1]}")
+        with shard_engine.connect() as conn:
+            STEPS[sys.argv[1]](conn)
+            conn.commit()
+    print("Done")
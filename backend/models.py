@@ -1,18 +1,60 @@
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, BINARY, Index, Integer, BigInteger, JSON
+from sqlalchemy.types import TypeDecorator
 from sqlalchemy.orm import relationship
-from database import Base
+from database import Base, DirectoryBase
 from datetime import datetime
+import os
+import time
 import uuid
 
 
 def generate_uuid():
-    return str(uuid.uuid4())
+    """
+    Generate a time-ordered UUIDv7 string
+
+    The first 48 bits are a millisecond timestamp, so new keys are appended
+    to the end of the primary key B-tree instead of landing on random pages.
+    """
+    timestamp_ms = time.time_ns() // 1_000_000
+    value = bytearray(timestamp_ms.to_bytes(6, "big") + os.urandom(10))
+    value[6] = (value[6] & 0x0F) | 0x70  # version 7
+    value[8] = (value[8] & 0x3F) | 0x80  # RFC 4122 variant
+    return str(uuid.UUID(bytes=bytes(value)))
+
+
+class BinaryUUID(TypeDecorator):
+    """
+    Store UUIDs as BINARY(16) while exposing them as strings
+
+    Uses the same byte order as MySQL's UUID_TO_BIN(id), so existing rows can
+    be converted in SQL (see migrations/uuid_to_binary.py).
+    """
+
+    impl = BINARY(16)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, uuid.UUID):
+            return value.bytes
+        try:
+            return uuid.UUID(str(value)).bytes
+        except ValueError:
+            # Not a UUID (e.g. a malformed path parameter) - it can't match
+            # any row, so compare against NULL and let the caller 404
+            return None
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return str(uuid.UUID(bytes=bytes(value)))
 
 
 class User(Base):
     __tablename__ = "users"
     
-    id = Column(String(36), primary_key=True, default=generate_uuid)
+    id = Column(BinaryUUID, primary_key=True, default=generate_uuid)
     username = Column(String(255), unique=True, nullable=False, index=True)
     hashed_password = Column(String(255), nullable=False)
     profile_picture_url = Column(String(500), nullable=True)  # S3 URL of the profile picture
@@ -27,7 +69,7 @@ class User(Base):
 class Todo(Base):
     __tablename__ = "todos"
     
-    id = Column(String(36), primary_key=True, default=generate_uuid)
+    id = Column(BinaryUUID, primary_key=True, default=generate_uuid)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
     completed = Column(Boolean, default=False, nullable=False)
@@ -35,7 +77,61 @@ class Todo(Base):
     image_key = Column(String(500), nullable=True)       # S3 object key for deletion
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    user_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    user_id = Column(BinaryUUID, ForeignKey("users.id"), nullable=False)
     
     # Relationship
     user = relationship("User", back_populates="todos")
+    
+    __table_args__ = (
+        Index("idx_todos_user_created", "user_id", "created_at"),
+        Index("idx_todos_completed_updated", "completed", "updated_at"),  # archive.py batches
+    )
+
+
+class TodoArchive(Base):
+    """Completed todos moved out of the hot `todos` table by archive.py"""
+    __tablename__ = "todos_archive"
+    
+    id = Column(BinaryUUID, primary_key=True)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    completed = Column(Boolean, default=True, nullable=False)
+    image_url = Column(String(500), nullable=True)
+    image_key = Column(String(500), nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
+    user_id = Column(BinaryUUID, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("idx_todos_archive_user_created", "user_id", "created_at"),
+    )
+
+
+class Job(Base):
+    """Outbox entry for a side effect, written in the same transaction as the change"""
+    __tablename__ = "jobs"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    kind = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String(20), default="pending", nullable=False)  # pending, running, failed
+    attempts = Column(Integer, default=0, nullable=False)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index("idx_jobs_status_run_after", "status", "run_after"),
+    )
+
+
+class UserDirectory(DirectoryBase):
+    """Maps usernames and user ids to the shard holding the user's data"""
+    __tablename__ = "user_directory"
+    
+    username = Column(String(255), primary_key=True)
+    user_id = Column(BinaryUUID, unique=True, nullable=False)
+    shard = Column(String(64), nullable=False)
+    moving = Column(Boolean, default=False, nullable=False)  # Set by rebalance.py while the user is copied
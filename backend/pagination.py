@@ -0,0 +1,51 @@
+"""
+Keyset pagination for GET /todos
+
+Pages are ordered by (created_at, id) and the cursor encodes the last row of
+the previous page, so every page is an index range scan on
+(user_id, created_at) no matter how deep the client has scrolled.
+"""
+import os
+import base64
+from datetime import datetime
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import or_, and_
+
+load_dotenv()
+
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+
+def encode_cursor(todo) -> str:
+    value = f"{todo.created_at.isoformat()}|{todo.id}"
+    return base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple]:
+    """Return (created_at, id) or None if the cursor is malformed"""
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, todo_id = value.split("|")
+        return datetime.fromisoformat(created_at), todo_id
+    except ValueError:
+        return None
+
+
+def order_by(model, descending: bool) -> list:
+    if descending:
+        return [model.created_at.desc(), model.id.desc()]
+    return [model.created_at.asc(), model.id.asc()]
+
+
+def after_cursor(model, cursor: tuple, descending: bool):
+    """Filter for the rows that follow the cursor in the page order"""
+    created_at, todo_id = cursor
+    if descending:
+        return or_(model.created_at < created_at, and_(model.created_at == created_at, model.id < todo_id))
+    return or_(model.created_at > created_at, and_(model.created_at == created_at, model.id > todo_id))
+
+
+def sort_key(todo) -> tuple:
+    # Hyphenated UUID strings sort like their BINARY(16) form
+    return todo.created_at, str(todo.id)
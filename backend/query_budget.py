@@ -0,0 +1,209 @@
+"""
+Per-request SQL statement counting and per-route query budgets
+
+Every statement executed through any engine is counted against the current
+request via SQLAlchemy engine events. QueryBudgetMiddleware compares the
+totals with QUERY_BUDGETS and, depending on QUERY_BUDGET_MODE, logs or
+answers with 500 on routes that run more statements than budgeted, repeat
+the same statement (the usual sign of an N+1 pattern) or fetch more rows
+than budgeted.
+check_query_budgets.py drives every budgeted route and fails the build on a
+regression.
+"""
+import os
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.responses import JSONResponse
+
+load_dotenv()
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log")  # off, log or enforce
+
+
+class QueryStats:
+    """Statements and rows of one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0  # Rows fetched from the database
+        self.statements = Counter()
+
+    def repeated(self) -> dict:
+        """Statements executed more than once"""
+        return {statement: count for statement, count in self.statements.items() if count > 1}
+
+
+class QueryBudget:
+    def __init__(self, max_queries: int, max_repeats: int = 1, max_rows: Optional[int] = None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats  # How often one identical statement may run
+        self.max_rows = max_rows  # Rows fetched, None for routes whose result size depends on the data
+
+    def check(self, stats: QueryStats) -> list[str]:
+        problems = []
+        if stats.count > self.max_queries:
+            problems.append(f"{stats.count} queries, budget is {self.max_queries}")
+        if self.max_rows is not None and stats.rows > self.max_rows:
+            problems.append(f"{stats.rows} rows fetched, budget is {self.max_rows}")
+        for statement, count in stats.statements.items():
+            if count > self.max_repeats:
+                problems.append(f"statement ran {count} times: {' '.join(statement.split())[:200]}")
+        return problems
+
+
+# Budgets for an authenticated user, keyed by "<METHOD> <route path>". Keep
+# them tight - raise one only together with the change that needs the extra
+# query. Routes whose query count grows with the input (POST /todos/import)
+# have no budget.
+QUERY_BUDGETS = {
+    "POST /auth/register": QueryBudget(3, max_rows=0),      # directory check, directory insert, user insert
+    "POST /auth/login": QueryBudget(2, max_rows=2),         # directory lookup, user
+    "GET /todos": QueryBudget(3),                           # user, todos, archive (include_archived)
+    "GET /todos/export": QueryBudget(3),                    # user, streamed todos, streamed archive
+    "GET /todos/{todo_id}": QueryBudget(3, max_rows=2),     # user, todo, archive fallback
+    "POST /todos": QueryBudget(2, max_rows=1),              # user, insert
+    "PUT /todos/{todo_id}": QueryBudget(3, max_rows=2),     # user, todo, update
+    "DELETE /todos/{todo_id}": QueryBudget(5, max_rows=2),  # user, todo, archive fallback, outbox insert, delete
+    "POST /todos/{todo_id}/image": QueryBudget(3, max_rows=2),
+    "DELETE /todos/{todo_id}/image": QueryBudget(5, max_rows=2),
+}
+
+current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = current_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.statements[statement] += 1
+
+
+class CountingCursor:
+    """DBAPI cursor wrapper that counts the rows fetched through it"""
+
+    def __init__(self, cursor, stats: QueryStats):
+        self.cursor = cursor
+        self.stats = stats
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.cursor.fetchmany(*args, **kwargs)
+        self.stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def count_rows(conn, cursor, statement, parameters, context, executemany):
+    # cursor.rowcount is -1 for SELECTs on most drivers until all rows are
+    # fetched, so count what the result actually fetches instead. The result
+    # is built from context.cursor after this event.
+    stats = current_stats.get()
+    if stats is not None and context is not None and cursor.description is not None:
+        context.cursor = CountingCursor(cursor, stats)
+
+
+@contextmanager
+def count_queries():
+    """Count the statements run inside the block (use in tests and scripts)"""
+    stats = QueryStats()
+    token = current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_stats.reset(token)
+
+
+@contextmanager
+def uncounted():
+    """Leave the statements run inside the block out of the current request's count"""
+    token = current_stats.set(None)
+    try:
+        yield
+    finally:
+        current_stats.reset(token)
+
+
+class QueryBudgetMiddleware:
+    """
+    ASGI middleware that checks each request against its route's budget
+
+    In enforce mode the response is held back until the handler has
+    finished, so a request over budget can still be answered with a 500
+    (this also stops streamed responses from streaming - use it in
+    development and CI only).
+    """
+
+    def __init__(self, app, mode: str = QUERY_BUDGET_MODE, budgets: dict = None):
+        self.app = app
+        self.mode = mode
+        self.budgets = budgets if budgets is not None else QUERY_BUDGETS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        held = []
+
+        async def hold(message):
+            held.append(message)
+
+        with count_queries() as stats:
+            await self.app(scope, receive, hold if self.mode == "enforce" else send)
+
+        problems = self.check(scope, stats)
+        message = None
+        if problems:
+            message = (
+                f"Query budget exceeded for {scope['method']} {scope['route'].path} "
+                f"({stats.count} queries, {stats.rows} rows): " + "; ".join(problems)
+            )
+            print(message)
+
+        if self.mode != "enforce":
+            return
+        if message is not None:
+            response = JSONResponse(
+                status_code=500,
+                content={
+                    "detail": {
+                        "error": {
+                            "code": "QUERY_BUDGET_EXCEEDED",
+                            "message": message
+                        }
+                    }
+                }
+            )
+            await response(scope, receive, send)
+            return
+        for held_message in held:
+            await send(held_message)
+
+    def check(self, scope, stats: QueryStats) -> list[str]:
+        # The router stores the matched route in the scope
+        route = scope.get("route")
+        if route is None:
+            return []
+        budget = self.budgets.get(f"{scope['method']} {route.path}")
+        if budget is None:
+            return []
+        return budget.check(stats)
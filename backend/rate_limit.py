@@ -0,0 +1,266 @@
+import os
+import time
+import json
+import threading
+from typing import Optional
+from dotenv import load_dotenv
+import auth
+
+load_dotenv()
+
+# Rate limit configuration
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")  # Shared store for multi-node deployments
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+# Number of trusted proxies in front of the API (1 for a load balancer); the
+# client IP is taken this many entries from the right of X-Forwarded-For,
+# since entries further left are set by the client and can be spoofed
+RATE_LIMIT_PROXY_HOPS = int(os.getenv("RATE_LIMIT_PROXY_HOPS", "1"))
+if RATE_LIMIT_PROXY_HOPS < 1:
+    raise ValueError("RATE_LIMIT_PROXY_HOPS must be at least 1, the entry added by the nearest proxy")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Keep this below the DB pool size (pool_size + max_overflow) so we shed load
+# before requests start queueing on connections
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "12"))
+
+
+def parse_rate(value: str) -> tuple[int, float]:
+    """Parse a "<requests>/<seconds>" budget into (capacity, seconds)"""
+    requests, _, seconds = value.partition("/")
+    return int(requests), float(seconds or 60)
+
+
+class RouteLimit:
+    """Token bucket budget for requests matching a method and path prefix"""
+
+    def __init__(self, name: str, method: Optional[str], path: str, rate: str, key_by: str = "user"):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.capacity, period = parse_rate(rate)
+        self.refill_rate = self.capacity / period  # Tokens per second
+        self.key_by = key_by  # "user" or "ip"
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.method is not None and self.method != method:
+            return False
+        return path == self.path or path.startswith(self.path + "/")
+
+
+# Per-route budgets, checked in order; the first match wins.
+# Auth routes are keyed by client IP since there is no user yet, and
+# login/register are expensive because of bcrypt.
+ROUTE_LIMITS = [
+    RouteLimit("login", "POST", "/auth/login", os.getenv("RATE_LIMIT_LOGIN", "10/60"), key_by="ip"),
+    RouteLimit("register", "POST", "/auth/register", os.getenv("RATE_LIMIT_REGISTER", "5/60"), key_by="ip"),
+    RouteLimit("read", "GET", "/todos", os.getenv("RATE_LIMIT_READ", "60/60")),
+    RouteLimit("write", None, "/todos", os.getenv("RATE_LIMIT_WRITE", "120/60")),
+]
+
+DEFAULT_LIMIT = RouteLimit("default", None, "/", os.getenv("RATE_LIMIT_DEFAULT", "300/60"))
+
+# Paths that are never limited
+EXEMPT_PATHS = {"/", "/docs", "/redoc", "/openapi.json", "/metrics/compression"}
+
+
+class InMemoryBucketStore:
+    """Token buckets held in process memory (one budget per worker)"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self.buckets = {}  # key -> [tokens, last_refill]
+        self.lock = threading.Lock()
+
+    async def take(self, key: str, capacity: int, refill_rate: float, cost: int = 1) -> tuple[bool, float]:
+        """
+        Take tokens from a bucket
+
+        Returns:
+            Tuple of (allowed, retry_after_seconds)
+        """
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_keys:
+                    self._evict(now, refill_rate, capacity)
+                bucket = [float(capacity), now]
+                self.buckets[key] = bucket
+
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+
+            bucket[0] = tokens
+            return False, (cost - tokens) / refill_rate
+
+    def _evict(self, now: float, refill_rate: float, capacity: int):
+        """Drop buckets that have refilled completely, they carry no state"""
+        idle = capacity / refill_rate
+        stale = [key for key, (_, last) in self.buckets.items() if now - last >= idle]
+        for key in stale:
+            del self.buckets[key]
+        # Still full of active clients - drop the oldest half
+        if len(self.buckets) >= self.max_keys:
+            ordered = sorted(self.buckets.items(), key=lambda item: item[1][1])
+            for key, _ in ordered[:len(ordered) // 2]:
+                del self.buckets[key]
+
+
+# Refill and take atomically on the Redis server. Uses the server clock so
+# that nodes with skewed clocks share one consistent view of each bucket.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared between nodes through Redis"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the 'redis' package is not installed")
+
+        self.client = redis.from_url(url, socket_timeout=0.05)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.prefix = prefix
+
+    async def take(self, key: str, capacity: int, refill_rate: float, cost: int = 1) -> tuple[bool, float]:
+        try:
+            allowed, retry_after = await self.script(
+                keys=[self.prefix + key], args=[capacity, refill_rate, cost]
+            )
+            return bool(int(allowed)), float(retry_after)
+        except Exception as e:
+            # Fail open - an unavailable limiter must not take the API down
+            print(f"Rate limit store error: {e}")
+            return True, 0.0
+
+
+def get_bucket_store():
+    if RATE_LIMIT_REDIS_URL:
+        return RedisBucketStore(RATE_LIMIT_REDIS_URL)
+    return InMemoryBucketStore()
+
+
+def error_response(status_code: int, code: str, message: str, retry_after: float) -> tuple[int, list, bytes]:
+    """Build an error response in the same shape as HTTPException details"""
+    body = json.dumps({"detail": {"error": {"code": code, "message": message}}}).encode("utf-8")
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+        (b"retry-after", str(max(1, int(retry_after + 0.999))).encode("latin-1")),
+    ]
+    return status_code, headers, body
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware for admission control
+
+    Requests are first checked against the global concurrency cap (503 when
+    exceeded) and then against the per-route token bucket (429 when empty).
+    Written as plain ASGI rather than BaseHTTPMiddleware to keep the
+    per-request overhead to a few microseconds.
+    """
+
+    def __init__(self, app, store=None, route_limits=None, max_concurrent: int = MAX_CONCURRENT_REQUESTS):
+        self.app = app
+        self.store = store or get_bucket_store()
+        self.route_limits = route_limits if route_limits is not None else ROUTE_LIMITS
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            await self._reject(send, *error_response(
+                503, "SERVER_BUSY", "Server is busy, please retry shortly", 1
+            ))
+            return
+
+        limit = self.get_route_limit(scope["method"], scope["path"])
+        key = f"{limit.name}:{self.get_client_key(scope, limit.key_by)}"
+        allowed, retry_after = await self.store.take(key, limit.capacity, limit.refill_rate)
+        if not allowed:
+            await self._reject(send, *error_response(
+                429, "RATE_LIMITED", "Too many requests, please slow down", retry_after
+            ))
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    def get_route_limit(self, method: str, path: str) -> RouteLimit:
+        for limit in self.route_limits:
+            if limit.matches(method, path):
+                return limit
+        return DEFAULT_LIMIT
+
+    def get_client_key(self, scope, key_by: str) -> str:
+        """Key requests by user id from the JWT, falling back to client IP"""
+        if key_by == "user":
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    if scheme.lower() == "bearer":
+                        payload = auth.verify_token(token)
+                        if payload and payload.get("user_id"):
+                            return "user:" + str(payload["user_id"])
+                    break
+        return "ip:" + get_client_ip(scope)
+
+    async def _reject(self, send, status_code: int, headers: list, body: bytes):
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+untrusted_proxy_warned = False
+
+
+def get_client_ip(scope) -> str:
+    global untrusted_proxy_warned
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            if RATE_LIMIT_TRUST_PROXY:
+                hops = [hop.strip() for hop in value.decode("latin-1").split(",")]
+                return hops[-min(RATE_LIMIT_PROXY_HOPS, len(hops))]
+            if not untrusted_proxy_warned:
+                # Behind a proxy every client shares its IP and therefore one
+                # login/register budget
+                print("Rate limiting by IP ignores X-Forwarded-For, set RATE_LIMIT_TRUST_PROXY=true "
+                      "if the API runs behind a load balancer or reverse proxy")
+                untrusted_proxy_warned = True
+            break
+    client = scope.get("client")
+    return client[0] if client else "unknown"
@@ -0,0 +1,207 @@
+"""
+Move users between shards after the shard list has changed
+
+Run from the backend directory:
+
+    python rebalance.py sync-directory   # add users missing from the directory
+    python rebalance.py plan             # show how many users would move
+    python rebalance.py run [limit]      # move users to the shard the ring assigns them
+
+Users are moved in small groups while the API keeps serving everyone else.
+A group is first flagged as moving in the directory (its users get 503 with
+Retry-After until the move is done), then the script waits for the API
+nodes' directory caches to expire, copies each user's rows to the new shard,
+points the directory at it and finally deletes the rows on the old shard.
+Requests that were already running on the old shard can still commit, so the
+delete only happens if the old rows are unchanged since the copy; otherwise
+the user is copied again. Interrupted moves can simply be re-run.
+"""
+import os
+import sys
+import time
+from dotenv import load_dotenv
+from sqlalchemy import select, insert, delete, update
+import models
+from sharding import router, DIRECTORY_CACHE_TTL
+
+load_dotenv()
+
+REBALANCE_GROUP_SIZE = int(os.getenv("REBALANCE_GROUP_SIZE", "50"))  # Users flagged as moving at once
+REBALANCE_BATCH_SIZE = int(os.getenv("REBALANCE_BATCH_SIZE", "1000"))  # Rows copied per INSERT
+REBALANCE_COPY_ATTEMPTS = int(os.getenv("REBALANCE_COPY_ATTEMPTS", "3"))  # Copies per user before giving up
+
+# Per-user tables, parents first
+USER_TABLES = [models.User.__table__, models.Todo.__table__, models.TodoArchive.__table__]
+
+
+def user_column(table):
+    return table.c.id if table.name == "users" else table.c.user_id
+
+
+def sync_directory() -> int:
+    """Add directory entries for users created before sharding was enabled"""
+    directory_table = models.UserDirectory.__table__
+    users = models.User.__table__
+    added = 0
+
+    for shard, shard_engine in router.engines.items():
+        with shard_engine.connect() as shard_conn, router.directory_engine.connect() as directory_conn:
+            result = shard_conn.execution_options(stream_results=True, yield_per=REBALANCE_BATCH_SIZE).execute(
+                select(users.c.id, users.c.username)
+            )
+            for rows in result.partitions():
+                known = set(directory_conn.execute(
+                    select(directory_table.c.user_id).where(directory_table.c.user_id.in_([row.id for row in rows]))
+                ).scalars())
+                missing = [
+                    {"username": row.username, "user_id": row.id, "shard": shard, "moving": False}
+                    for row in rows if row.id not in known
+                ]
+                if missing:
+                    directory_conn.execute(insert(directory_table), missing)
+                    directory_conn.commit()
+                    added += len(missing)
+
+    return added
+
+
+def plan_moves() -> list[tuple]:
+    """Return (user_id, source, target) for every user not on its ring shard"""
+    directory_table = models.UserDirectory.__table__
+    moves = []
+    with router.directory_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=REBALANCE_BATCH_SIZE).execute(
+            select(directory_table.c.user_id, directory_table.c.shard)
+        )
+        for row in result:
+            target = router.place(row.user_id)
+            if target != row.shard:
+                moves.append((row.user_id, row.shard, target))
+    return moves
+
+
+def copy_user(user_id: str, source: str, target: str):
+    """Copy all of a user's rows from source to target in one target transaction"""
+    with router.engines[source].connect() as source_conn, router.engines[target].begin() as target_conn:
+        # Remove leftovers of an interrupted earlier attempt
+        for table in reversed(USER_TABLES):
+            target_conn.execute(delete(table).where(user_column(table) == user_id))
+
+        for table in USER_TABLES:
+            result = source_conn.execution_options(stream_results=True, yield_per=REBALANCE_BATCH_SIZE).execute(
+                select(table).where(user_column(table) == user_id)
+            )
+            for rows in result.partitions():
+                target_conn.execute(insert(table), [dict(row._mapping) for row in rows])
+
+
+def user_fingerprint(conn, user_id: str, lock: bool = False) -> tuple:
+    """
+    Row count, newest id and newest update per table for one user
+
+    Any insert (ids are time-ordered), delete or update of the user's rows
+    changes it. With lock=True the rows are locked until the transaction ends.
+    """
+    fingerprint = []
+    for table in USER_TABLES:
+        columns = [table.c.id] + ([table.c.updated_at] if "updated_at" in table.c else [])
+        query = select(*columns).where(user_column(table) == user_id)
+        if lock:
+            query = query.with_for_update()
+        rows = conn.execute(query).all()
+        fingerprint.append((
+            len(rows),
+            max((str(row.id) for row in rows), default=None),
+            max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+            if len(columns) > 1 else None,
+        ))
+    return tuple(fingerprint)
+
+
+def source_fingerprint(user_id: str, shard: str) -> tuple:
+    with router.engines[shard].connect() as conn:
+        return user_fingerprint(conn, user_id)
+
+
+def finish_move(user_id: str, source: str, target: str, expected: tuple) -> bool:
+    """
+    Point the directory at target and delete the user's rows on source
+
+    Requests that picked the source shard before the user was flagged as
+    moving may still commit (e.g. a long import). The source rows are locked
+    and compared with the state that was copied; if anything changed nothing
+    is deleted and False is returned so the caller copies again.
+    """
+    with router.engines[source].begin() as conn:
+        if user_fingerprint(conn, user_id, lock=True) != expected:
+            return False
+        # A crash after this leaves orphaned rows on source, never lost ones
+        set_directory([user_id], shard=target, moving=False)
+        for table in reversed(USER_TABLES):
+            conn.execute(delete(table).where(user_column(table) == user_id))
+    return True
+
+
+def set_directory(user_ids: list, **values):
+    directory_table = models.UserDirectory.__table__
+    with router.directory_engine.begin() as conn:
+        conn.execute(update(directory_table).where(directory_table.c.user_id.in_(user_ids)).values(**values))
+
+
+def move_group(moves: list[tuple]) -> int:
+    """Move a group of users, returns the number of users moved"""
+    set_directory([user_id for user_id, _, _ in moves], moving=True)
+    # Wait until no API node routes these users from a stale cache entry
+    time.sleep(DIRECTORY_CACHE_TTL + 1)
+
+    moved = 0
+    for user_id, source, target in moves:
+        try:
+            for _ in range(REBALANCE_COPY_ATTEMPTS):
+                expected = source_fingerprint(user_id, source)
+                copy_user(user_id, source, target)
+                if finish_move(user_id, source, target, expected):
+                    moved += 1
+                    break
+            else:
+                print(f"User {user_id} kept changing on {source}, not moved")
+                set_directory([user_id], moving=False)
+        except Exception as e:
+            print(f"Failed to move user {user_id} from {source} to {target}: {e}")
+            set_directory([user_id], moving=False)
+
+    return moved
+
+
+def rebalance(limit: int = None) -> int:
+    moves = plan_moves()
+    if limit is not None:
+        moves = moves[:limit]
+
+    moved = 0
+    for start in range(0, len(moves), REBALANCE_GROUP_SIZE):
+        moved += move_group(moves[start:start + REBALANCE_GROUP_SIZE])
+        print(f"Moved {moved}/{len(moves)} users")
+    return moved
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    router.create_all()
+
+    if command == "sync-directory":
+        print(f"Added {sync_directory()} users to the directory")
+    elif command == "plan":
+        moves = plan_moves()
+        print(f"{len(moves)} users would move")
+        for source in router.engines:
+            for target in router.engines:
+                count = sum(1 for _, s, t in moves if s == source and t == target)
+                if count:
+                    print(f"  {source} -> {target}: {count}")
+    elif command == "run":
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(f"Moved {rebalance(limit)} users")
+    else:
+        print("Usage: python rebalance.py [sync-directory|plan|run [limit]]")
+        sys.exit(1)
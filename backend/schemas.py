@@ -57,4 +57,9 @@ class TodoResponse(BaseModel):
 
 class TodoListResponse(BaseModel):
     todos: List[TodoResponse]
-    total: int
\ No newline at end of file
+    total: int
+    nextCursor: Optional[str] = None  # Set when `limit` cut the list short
+
+
+class TodoImportResponse(BaseModel):
+    imported: int
@@ -0,0 +1,43 @@
+"""
+Test setup: three SQLite file shards plus a SQLite directory database
+
+The backend modules read their configuration at import time, so the
+environment is set up here before any of them is imported.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="todo-tests-")
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(DATA_DIR, "directory.db")
+os.environ["DB_SHARDS"] = ",".join(
+    f"s{i}=sqlite:///" + os.path.join(DATA_DIR, f"s{i}.db") for i in range(3)
+)
+os.environ["DIRECTORY_CACHE_TTL"] = "0"  # Every request reads the directory
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["QUERY_BUDGET_MODE"] = "off"
+
+sys.path.insert(0, BACKEND_DIR)
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    from main import app
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def register(client):
+    """Register a user and return (user_id, auth headers)"""
+    def register(username: str, password: str = "secret1"):
+        response = client.post("/auth/register", json={"username": username, "password": password})
+        assert response.status_code == 201, response.text
+        data = response.json()
+        return data["id"], {"Authorization": f"Bearer {data['token']}"}
+    return register
@@ -0,0 +1,65 @@
+from datetime import datetime
+import archive
+import models
+from sharding import router
+
+
+def archive_everything_completed():
+    # A cutoff in the future archives every completed todo
+    return archive.archive_completed_todos(older_than_days=-1)
+
+
+def queued_jobs(shard: str, kind: str) -> list:
+    db = router.session(shard)
+    try:
+        return db.query(models.Job).filter(models.Job.kind == kind).all()
+    finally:
+        db.close()
+
+
+def test_archive_moves_only_completed_todos(client, register):
+    _, headers = register("archiver")
+    done = client.post("/todos", params={"title": "Done"}, headers=headers).json()
+    client.put(f"/todos/{done['id']}", json={"completed": True}, headers=headers)
+    client.post("/todos", params={"title": "Open"}, headers=headers)
+
+    assert archive_everything_completed() >= 1
+
+    assert client.get("/todos", headers=headers).json()["total"] == 1
+    assert client.get("/todos", params={"include_archived": "true"}, headers=headers).json()["total"] == 2
+    assert client.get(f"/todos/{done['id']}", headers=headers).json()["completed"] is True
+
+
+def test_archived_todo_can_be_deleted(client, register):
+    user_id, headers = register("archivedelete")
+    shard = router.place(user_id)
+    todo_id = models.generate_uuid()
+    db = router.session(shard)
+    db.add(models.TodoArchive(
+        id=todo_id, title="Archived", completed=True, image_url="https://example.com/a.png",
+        image_key="todos/a.png", created_at=datetime.utcnow(), user_id=user_id
+    ))
+    db.commit()
+    db.close()
+
+    assert client.delete(f"/todos/{todo_id}", headers=headers).status_code == 204
+    assert client.get(f"/todos/{todo_id}", headers=headers).status_code == 404
+    assert "todos/a.png" in [job.payload["file_key"] for job in queued_jobs(shard, "s3.delete_object")]
+
+
+def test_archived_todo_image_can_be_deleted(client, register):
+    user_id, headers = register("archiveimage")
+    shard = router.place(user_id)
+    todo_id = models.generate_uuid()
+    db = router.session(shard)
+    db.add(models.TodoArchive(
+        id=todo_id, title="Archived", completed=True, image_url="https://example.com/b.png",
+        image_key="todos/b.png", created_at=datetime.utcnow(), user_id=user_id
+    ))
+    db.commit()
+    db.close()
+
+    response = client.delete(f"/todos/{todo_id}/image", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["imageUrl"] is None
+    assert "todos/b.png" in [job.payload["file_key"] for job in queued_jobs(shard, "s3.delete_object")]
@@ -0,0 +1,48 @@
+import csv
+import io
+import json
+import archive
+
+
+def test_export_includes_archived_todos(client, register):
+    _, headers = register("exporter")
+    for title in ("Open", "Done"):
+        todo = client.post("/todos", params={"title": title}, headers=headers).json()
+    client.put(f"/todos/{todo['id']}", json={"completed": True}, headers=headers)
+    archive.archive_completed_todos(older_than_days=-1)
+
+    response = client.get("/todos/export", headers=headers)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["title"] for line in lines] == ["Open", "Done"]
+
+    response = client.get("/todos/export", params={"format": "csv"}, headers=headers)
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["title"] for row in rows] == ["Open", "Done"]
+
+
+def test_export_then_import_round_trips(client, register):
+    _, source = register("roundtrip1")
+    _, target = register("roundtrip2")
+    for i in range(3):
+        client.post("/todos", params={"title": f"Todo {i}", "description": "Desc"}, headers=source)
+
+    exported = client.get("/todos/export", headers=source).content
+    response = client.post(
+        "/todos/import", headers=target, files={"file": ("todos.ndjson", exported, "application/x-ndjson")}
+    )
+    assert response.json()["imported"] == 3
+    titles = sorted(todo["title"] for todo in client.get("/todos", headers=target).json()["todos"])
+    assert titles == ["Todo 0", "Todo 1", "Todo 2"]
+
+
+def test_import_rejects_records_with_wrong_types(client, register):
+    _, headers = register("badimport")
+    for record in ({"title": "a", "description": {"x": 1}}, {"title": "a", "completed": {"x": 1}}):
+        content = json.dumps({"title": "ok"}) + "\n" + json.dumps(record) + "\n"
+        response = client.post(
+            "/todos/import", headers=headers, files={"file": ("todos.ndjson", content, "application/x-ndjson")}
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"]["error"]["code"] == "INVALID_IMPORT_RECORD"
+        assert response.json()["detail"]["error"]["message"].startswith("Record 2:")
+    assert client.get("/todos", headers=headers).json()["todos"] == []
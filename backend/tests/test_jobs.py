@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+import jobs
+import models
+from sharding import router
+
+SHARD = "s0"
+
+
+def add_job(**values) -> int:
+    db = router.session(SHARD)
+    try:
+        job = models.Job(kind="s3.delete_object", payload={"bucket_name": "b", "file_key": "k"}, **values)
+        db.add(job)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+
+def get_job(job_id: int) -> models.Job:
+    db = router.session(SHARD)
+    try:
+        return db.get(models.Job, job_id)
+    finally:
+        db.close()
+
+
+def stale_running(**values) -> dict:
+    locked_at = datetime.utcnow() - timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 60)
+    return {"status": "running", "locked_at": locked_at, **values}
+
+
+def claimed_by_id() -> dict:
+    return {job[0]: job for job in jobs.claim_jobs(SHARD, batch_size=1000)}
+
+
+def test_pending_job_is_claimed_without_counting_an_attempt():
+    job_id = add_job(status="pending", run_after=datetime.utcnow())
+
+    claimed = claimed_by_id()
+    assert claimed[job_id][3] == 0
+    assert get_job(job_id).status == "running"
+
+
+def test_stale_running_job_is_reclaimed_as_failed_attempt():
+    job_id = add_job(**stale_running(attempts=2))
+
+    claimed = claimed_by_id()
+    assert claimed[job_id][3] == 3
+    job = get_job(job_id)
+    assert (job.status, job.attempts) == ("running", 3)
+
+
+def test_stale_running_job_fails_after_max_attempts():
+    job_id = add_job(**stale_running(attempts=jobs.JOB_MAX_ATTEMPTS - 1))
+
+    assert job_id not in claimed_by_id()
+    job = get_job(job_id)
+    assert (job.status, job.attempts) == ("failed", jobs.JOB_MAX_ATTEMPTS)
+    assert job.last_error
+
+
+def test_failed_job_is_retried_with_backoff():
+    job_id = add_job(status="pending", run_after=datetime.utcnow())
+    _, _, _, attempts, locked_at = claimed_by_id()[job_id]
+
+    jobs.finish_jobs(SHARD, [(job_id, attempts, locked_at, "RuntimeError: boom")])
+    job = get_job(job_id)
+    assert (job.status, job.attempts) == ("pending", 1)
+    assert job.run_after > datetime.utcnow()
+
+
+def test_result_of_reclaimed_job_is_ignored():
+    job_id = add_job(status="pending", run_after=datetime.utcnow())
+    _, _, _, _, locked_at = claimed_by_id()[job_id]
+    # The first worker took too long and another one reclaimed the job
+    db = router.session(SHARD)
+    db.get(models.Job, job_id).locked_at = locked_at + timedelta(seconds=jobs.JOB_LOCK_TIMEOUT + 1)
+    db.commit()
+    db.close()
+
+    jobs.finish_jobs(SHARD, [(job_id, 0, locked_at, None)])
+    assert get_job(job_id).status == "running"
+    jobs.finish_jobs(SHARD, [(job_id, 0, locked_at, "RuntimeError: boom")])
+    job = get_job(job_id)
+    assert (job.status, job.attempts, job.last_error) == ("running", 0, None)
@@ -0,0 +1,48 @@
+from fastapi.testclient import TestClient
+import query_budget
+from main import app
+
+
+def enforcing_client(budgets: dict) -> TestClient:
+    return TestClient(query_budget.QueryBudgetMiddleware(app, mode="enforce", budgets=budgets))
+
+
+def test_enforce_mode_replaces_response_over_budget(client, register):
+    _, headers = register("overbudget")
+    client.post("/todos", params={"title": "Todo"}, headers=headers)
+
+    response = enforcing_client({"GET /todos": query_budget.QueryBudget(0)}).get("/todos", headers=headers)
+    assert response.status_code == 500
+    assert response.json()["detail"]["error"]["code"] == "QUERY_BUDGET_EXCEEDED"
+
+
+def test_enforce_mode_passes_response_within_budget(client, register):
+    _, headers = register("inbudget")
+    client.post("/todos", params={"title": "Todo"}, headers=headers)
+
+    response = enforcing_client(query_budget.QUERY_BUDGETS).get("/todos", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["total"] == 1
+
+
+def test_repeated_statement_is_reported():
+    stats = query_budget.QueryStats()
+    stats.count = 3
+    stats.statements["SELECT * FROM todos WHERE id = ?"] = 3
+    problems = query_budget.QueryBudget(10).check(stats)
+    assert len(problems) == 1
+    assert "ran 3 times" in problems[0]
+
+
+def test_fetched_rows_are_counted_and_budgeted(client, register):
+    _, headers = register("rowcounter")
+    for i in range(3):
+        client.post("/todos", params={"title": f"Todo {i}"}, headers=headers)
+
+    with query_budget.count_queries() as stats:
+        client.get("/todos", headers=headers)
+    assert stats.rows == 4  # user + 3 todos
+
+    response = enforcing_client({"GET /todos": query_budget.QueryBudget(3, max_rows=2)}).get("/todos", headers=headers)
+    assert response.status_code == 500
+    assert "4 rows fetched, budget is 2" in response.json()["detail"]["error"]["message"]
@@ -0,0 +1,116 @@
+import asyncio
+import importlib
+import pytest
+from fastapi.testclient import TestClient
+import auth
+import rate_limit
+
+
+def scope_with(forwarded_for=None, client=("10.0.0.1", 1234)) -> dict:
+    headers = [(b"x-forwarded-for", forwarded_for.encode("latin-1"))] if forwarded_for else []
+    return {"type": "http", "headers": headers, "client": client}
+
+
+def test_forwarded_for_is_ignored_unless_trusted(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_PROXY", False)
+    assert rate_limit.get_client_ip(scope_with("203.0.113.7")) == "10.0.0.1"
+
+
+def test_trusted_forwarded_for_uses_entry_added_by_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_PROXY", True)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_PROXY_HOPS", 1)
+    # The client prepended a spoofed address, the load balancer appended the real one
+    assert rate_limit.get_client_ip(scope_with("1.2.3.4, 203.0.113.7")) == "203.0.113.7"
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_PROXY_HOPS", 2)
+    assert rate_limit.get_client_ip(scope_with("203.0.113.7, 10.1.1.1")) == "203.0.113.7"
+    assert rate_limit.get_client_ip(scope_with("203.0.113.7")) == "203.0.113.7"
+
+
+def test_bucket_refuses_when_empty_and_reports_retry_after():
+    store = rate_limit.InMemoryBucketStore()
+
+    async def take_all():
+        return [await store.take("login:ip:10.0.0.1", 2, 2 / 60) for _ in range(3)]
+
+    results = asyncio.run(take_all())
+    assert [allowed for allowed, _ in results] == [True, True, False]
+    assert results[2][1] > 0
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def limited_client(**kwargs) -> tuple:
+    middleware = rate_limit.RateLimitMiddleware(ok_app, store=rate_limit.InMemoryBucketStore(), **kwargs)
+    return middleware, TestClient(middleware)
+
+
+def bearer(user_id: str) -> dict:
+    return {"Authorization": "Bearer " + auth.create_access_token({"user_id": user_id})}
+
+
+def test_proxy_hops_below_one_are_rejected(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_PROXY_HOPS", "0")
+    with pytest.raises(ValueError):
+        importlib.reload(rate_limit)
+    monkeypatch.setenv("RATE_LIMIT_PROXY_HOPS", "1")
+    importlib.reload(rate_limit)
+
+
+def test_empty_bucket_gets_429_with_retry_after():
+    limits = [rate_limit.RouteLimit("login", "POST", "/auth/login", "2/60", key_by="ip")]
+    _, client = limited_client(route_limits=limits)
+
+    assert [client.post("/auth/login").status_code for _ in range(2)] == [200, 200]
+    response = client.post("/auth/login")
+    assert response.status_code == 429
+    assert response.json()["detail"]["error"]["code"] == "RATE_LIMITED"
+    assert int(response.headers["retry-after"]) >= 1
+    # Other routes have their own buckets
+    assert client.get("/todos").status_code == 200
+
+
+def test_concurrency_cap_gets_503():
+    middleware, client = limited_client(max_concurrent=2)
+    middleware.in_flight = 2
+
+    response = client.get("/todos")
+    assert response.status_code == 503
+    assert response.json()["detail"]["error"]["code"] == "SERVER_BUSY"
+    assert response.headers["retry-after"] == "1"
+
+    middleware.in_flight = 1
+    assert client.get("/todos").status_code == 200
+    assert middleware.in_flight == 1
+
+
+def test_routes_match_first_limit_by_method_and_prefix():
+    middleware = rate_limit.RateLimitMiddleware(ok_app, store=rate_limit.InMemoryBucketStore())
+    assert middleware.get_route_limit("POST", "/auth/login").name == "login"
+    assert middleware.get_route_limit("GET", "/todos").name == "read"
+    assert middleware.get_route_limit("GET", "/todos/123").name == "read"
+    assert middleware.get_route_limit("DELETE", "/todos/123").name == "write"
+    assert middleware.get_route_limit("GET", "/todosx").name == "default"
+    assert middleware.get_route_limit("GET", "/auth/login").name == "default"
+
+
+def test_requests_are_keyed_by_user_or_ip():
+    middleware = rate_limit.RateLimitMiddleware(ok_app, store=rate_limit.InMemoryBucketStore())
+    scope = scope_with()
+    scope["headers"].append((b"authorization", bearer("user-1")["Authorization"].encode("latin-1")))
+    assert middleware.get_client_key(scope, "user") == "user:user-1"
+    assert middleware.get_client_key(scope, "ip") == "ip:10.0.0.1"
+
+    invalid = scope_with()
+    invalid["headers"].append((b"authorization", b"Bearer not-a-token"))
+    assert middleware.get_client_key(invalid, "user") == "ip:10.0.0.1"
+
+    # Users behind the same IP have separate buckets
+    limits = [rate_limit.RouteLimit("read", "GET", "/todos", "1/60")]
+    _, client = limited_client(route_limits=limits)
+    assert client.get("/todos", headers=bearer("user-1")).status_code == 200
+    assert client.get("/todos", headers=bearer("user-1")).status_code == 429
+    assert client.get("/todos", headers=bearer("user-2")).status_code == 200
@@ -0,0 +1,234 @@
+from datetime import datetime
+import auth
+import models
+import query_budget
+import rebalance
+from sharding import HashRing, router
+
+
+def shard_rows(shard: str, model, user_column, user_id: str) -> list:
+    db = router.session(shard)
+    try:
+        return db.query(model).filter(user_column == user_id).all()
+    finally:
+        db.close()
+
+
+def directory_entry(user_id: str):
+    directory = router.DirectorySession()
+    try:
+        return directory.query(models.UserDirectory).filter(models.UserDirectory.user_id == user_id).first()
+    finally:
+        directory.close()
+
+
+def test_hash_ring_is_deterministic():
+    keys = [models.generate_uuid() for _ in range(1000)]
+    first = HashRing(["s0", "s1", "s2"])
+    second = HashRing(["s0", "s1", "s2"])
+    assert [first.get(key) for key in keys] == [second.get(key) for key in keys]
+
+
+def test_hash_ring_adding_a_shard_only_moves_keys_to_it():
+    keys = [models.generate_uuid() for _ in range(5000)]
+    before = HashRing(["s0", "s1", "s2"])
+    after = HashRing(["s0", "s1", "s2", "s3"])
+
+    moved = [key for key in keys if before.get(key) != after.get(key)]
+    assert all(after.get(key) == "s3" for key in moved)
+    # Roughly a quarter of the keys should move to the new shard
+    assert 0.15 < len(moved) / len(keys) < 0.35
+
+
+def test_hash_ring_removing_a_shard_only_moves_its_keys():
+    keys = [models.generate_uuid() for _ in range(5000)]
+    before = HashRing(["s0", "s1", "s2"])
+    after = HashRing(["s0", "s2"])
+
+    for key in keys:
+        if before.get(key) != "s1":
+            assert after.get(key) == before.get(key)
+
+
+def test_register_places_user_on_ring_shard(register):
+    for i in range(10):
+        user_id, _ = register(f"placed{i}")
+        shard = router.place(user_id)
+        assert directory_entry(user_id).shard == shard
+        for other in router.engines:
+            rows = shard_rows(other, models.User, models.User.id, user_id)
+            assert len(rows) == (1 if other == shard else 0)
+
+
+def test_login_and_crud_are_routed_to_users_shard(client, register):
+    user_id, _ = register("cruduser")
+    shard = router.place(user_id)
+
+    response = client.post("/auth/login", json={"username": "cruduser", "password": "secret1"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+    todo = client.post("/todos", params={"title": "Routed"}, headers=headers).json()
+    assert [row.id for row in shard_rows(shard, models.Todo, models.Todo.user_id, user_id)] == [todo["id"]]
+
+    response = client.put(f"/todos/{todo['id']}", json={"completed": True}, headers=headers)
+    assert response.json()["completed"] is True
+    assert client.get(f"/todos/{todo['id']}", headers=headers).status_code == 200
+    assert client.get("/todos", headers=headers).json()["total"] == 1
+
+    assert client.delete(f"/todos/{todo['id']}", headers=headers).status_code == 204
+    assert shard_rows(shard, models.Todo, models.Todo.user_id, user_id) == []
+
+
+def test_users_cannot_see_each_others_todos(client, register):
+    _, first = register("isolated1")
+    _, second = register("isolated2")
+    todo = client.post("/todos", params={"title": "Mine"}, headers=first).json()
+
+    # 403 when both users live on the same shard, 404 when they don't
+    assert client.get(f"/todos/{todo['id']}", headers=second).status_code in (403, 404)
+    assert client.get("/todos", headers=second).json()["total"] == 0
+
+
+def test_duplicate_username_is_rejected(client, register):
+    register("taken")
+    response = client.post("/auth/register", json={"username": "taken", "password": "secret1"})
+    assert response.status_code == 400
+    assert response.json()["detail"]["error"]["code"] == "USERNAME_EXISTS"
+
+
+def test_user_missing_from_directory_is_backfilled(client):
+    # A user created before the directory existed
+    user_id = models.generate_uuid()
+    shard = router.place(user_id)
+    db = router.session(shard)
+    db.add(models.User(id=user_id, username="legacyuser", hashed_password=auth.get_password_hash("secret1")))
+    db.commit()
+    db.close()
+
+    response = client.post("/auth/register", json={"username": "legacyuser", "password": "secret1"})
+    assert response.status_code == 400
+    assert directory_entry(user_id).shard == shard
+
+    response = client.post("/auth/login", json={"username": "legacyuser", "password": "secret1"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    assert client.get("/todos", headers=headers).status_code == 200
+
+
+def test_backfill_is_not_counted_and_can_be_turned_off(client):
+    user_id = models.generate_uuid()
+    db = router.session(router.place(user_id))
+    db.add(models.User(id=user_id, username="legacyoff", hashed_password=auth.get_password_hash("secret1")))
+    db.commit()
+    db.close()
+
+    assert router.backfill_directory(username="legacyoff", enabled=False) is None
+    assert directory_entry(user_id) is None
+
+    # Unknown usernames scan every shard, outside the route's query budget
+    with query_budget.count_queries() as stats:
+        response = client.post("/auth/login", json={"username": "nosuchuser", "password": "secret1"})
+    assert response.status_code == 401
+    assert stats.count == 1
+
+
+def test_moving_user_gets_503(client, register):
+    user_id, headers = register("moving")
+
+    rebalance.set_directory([user_id], moving=True)
+    try:
+        response = client.get("/todos", headers=headers)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+        assert response.json()["detail"]["error"]["code"] == "USER_MIGRATING"
+
+        response = client.post("/auth/login", json={"username": "moving", "password": "secret1"})
+        assert response.status_code == 503
+    finally:
+        rebalance.set_directory([user_id], moving=False)
+
+    assert client.get("/todos", headers=headers).status_code == 200
+
+
+def test_move_group_copies_user_and_deletes_source(client, register, monkeypatch):
+    monkeypatch.setattr(rebalance.time, "sleep", lambda seconds: None)
+    user_id, headers = register("mover")
+    source = router.place(user_id)
+    target = next(shard for shard in router.engines if shard != source)
+
+    for i in range(3):
+        client.post("/todos", params={"title": f"Todo {i}"}, headers=headers)
+    db = router.session(source)
+    db.add(models.TodoArchive(
+        id=models.generate_uuid(), title="Archived", completed=True,
+        created_at=datetime.utcnow(), user_id=user_id
+    ))
+    db.commit()
+    db.close()
+
+    assert rebalance.move_group([(user_id, source, target)]) == 1
+
+    entry = directory_entry(user_id)
+    assert (entry.shard, entry.moving) == (target, False)
+    assert len(shard_rows(target, models.User, models.User.id, user_id)) == 1
+    assert len(shard_rows(target, models.Todo, models.Todo.user_id, user_id)) == 3
+    assert len(shard_rows(target, models.TodoArchive, models.TodoArchive.user_id, user_id)) == 1
+    assert shard_rows(source, models.User, models.User.id, user_id) == []
+    assert shard_rows(source, models.Todo, models.Todo.user_id, user_id) == []
+    assert shard_rows(source, models.TodoArchive, models.TodoArchive.user_id, user_id) == []
+
+    # Requests are now served from the target shard
+    response = client.get("/todos", params={"include_archived": "true"}, headers=headers)
+    assert response.json()["total"] == 4
+
+
+def test_move_group_recopies_rows_written_after_the_copy(client, register, monkeypatch):
+    monkeypatch.setattr(rebalance.time, "sleep", lambda seconds: None)
+    user_id, headers = register("latewriter")
+    source = router.place(user_id)
+    target = next(shard for shard in router.engines if shard != source)
+    client.post("/todos", params={"title": "Before"}, headers=headers)
+
+    copies = []
+    copy_user = rebalance.copy_user
+
+    def copy_then_write(*args):
+        copy_user(*args)
+        copies.append(args)
+        if len(copies) == 1:
+            # A request that picked the source shard before the move commits late
+            db = router.session(source)
+            db.add(models.Todo(id=models.generate_uuid(), title="Late", user_id=user_id))
+            db.commit()
+            db.close()
+
+    monkeypatch.setattr(rebalance, "copy_user", copy_then_write)
+
+    assert rebalance.move_group([(user_id, source, target)]) == 1
+    assert len(copies) == 2
+    titles = sorted(todo.title for todo in shard_rows(target, models.Todo, models.Todo.user_id, user_id))
+    assert titles == ["Before", "Late"]
+    assert shard_rows(source, models.Todo, models.Todo.user_id, user_id) == []
+
+
+def test_move_group_keeps_source_when_user_keeps_changing(client, register, monkeypatch):
+    monkeypatch.setattr(rebalance.time, "sleep", lambda seconds: None)
+    user_id, headers = register("busywriter")
+    source = router.place(user_id)
+    target = next(shard for shard in router.engines if shard != source)
+    copy_user = rebalance.copy_user
+
+    def copy_then_write(*args):
+        copy_user(*args)
+        db = router.session(source)
+        db.add(models.Todo(id=models.generate_uuid(), title="Again", user_id=user_id))
+        db.commit()
+        db.close()
+
+    monkeypatch.setattr(rebalance, "copy_user", copy_then_write)
+
+    assert rebalance.move_group([(user_id, source, target)]) == 0
+    entry = directory_entry(user_id)
+    assert (entry.shard, entry.moving) == (source, False)
+    assert len(shard_rows(source, models.Todo, models.Todo.user_id, user_id)) == rebalance.REBALANCE_COPY_ATTEMPTS
@@ -8,9 +8,11 @@ ALTER DATABASE tododb CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 GRANT ALL PRIVILEGES ON tododb.* TO 'todouser'@'%';
 FLUSH PRIVILEGES;
 
+-- IDs are UUIDs stored as BINARY(16) (see BinaryUUID in backend/models.py)
+
 -- Create users table
 CREATE TABLE IF NOT EXISTS users (
-    id VARCHAR(36) PRIMARY KEY,
+    id BINARY(16) PRIMARY KEY,
     username VARCHAR(255) UNIQUE NOT NULL,
     hashed_password VARCHAR(255) NOT NULL,
     profile_picture_url VARCHAR(500) NULL,
@@ -21,7 +23,7 @@ CREATE TABLE IF NOT EXISTS users (
 
 -- Create todos table with image fields
 CREATE TABLE IF NOT EXISTS todos (
-    id VARCHAR(36) PRIMARY KEY,
+    id BINARY(16) PRIMARY KEY,
     title VARCHAR(255) NOT NULL,
     description TEXT NULL,
     completed BOOLEAN DEFAULT FALSE NOT NULL,
@@ -29,11 +31,49 @@ CREATE TABLE IF NOT EXISTS todos (
     image_key VARCHAR(500) NULL,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-    user_id VARCHAR(36) NOT NULL,
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+    user_id BINARY(16) NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_todos_user_created (user_id, created_at),
+    INDEX idx_todos_completed_updated (completed, updated_at)
+);
+
+-- Create archive table for old completed todos (filled by backend/archive.py)
+CREATE TABLE IF NOT EXISTS todos_archive (
+    id BINARY(16) PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    description TEXT NULL,
+    completed BOOLEAN DEFAULT TRUE NOT NULL,
+    image_url VARCHAR(500) NULL,
+    image_key VARCHAR(500) NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NULL,
+    user_id BINARY(16) NOT NULL,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_todos_archive_user_created (user_id, created_at)
+);
+
+-- Create outbox table for background jobs (processed by backend/jobs.py)
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(100) NOT NULL,
+    payload JSON NOT NULL,
+    status VARCHAR(20) DEFAULT 'pending' NOT NULL,
+    attempts INT DEFAULT 0 NOT NULL,
+    run_after DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    locked_at DATETIME NULL,
+    last_error TEXT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    INDEX idx_jobs_status_run_after (status, run_after)
+);
+
+-- Create user directory (only used in the directory database, see backend/sharding.py)
+CREATE TABLE IF NOT EXISTS user_directory (
+    username VARCHAR(255) PRIMARY KEY,
+    user_id BINARY(16) UNIQUE NOT NULL,
+    shard VARCHAR(64) NOT NULL,
+    moving BOOLEAN DEFAULT FALSE NOT NULL
 );
 
 -- Optional: Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_todos_user_id ON todos(user_id);
-CREATE INDEX IF NOT EXISTS idx_todos_completed ON todos(completed);
 CREATE INDEX IF NOT EXISTS idx_todos_created_at ON todos(created_at);
\ No newline at end of file
@@ -1,6 +1,13 @@
-from flask import Flask, render_template, jsonify, send_from_directory
+from flask import Flask, render_template, request, abort
 from dotenv import load_dotenv
 import os
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, assets are still served gzipped
+    brotli = None
 
 # Load environment variables from .env file
 load_dotenv()
@@ -11,6 +18,95 @@ app = Flask(__name__)
 API_URL = os.getenv('API_URL')
 SERVER_NUMBER = os.getenv('SERVER_NUMBER', '1')
 
+STATIC_DIR = os.path.join(app.root_path, 'static')
+ASSET_FILES = ['styles.css', 'auth.js', 'app.js']
+MIMETYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+}
+
+# Fingerprinted assets never change, so browsers may cache them for a year
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# Unversioned URLs must be revalidated, but can be answered with 304
+REVALIDATE_CACHE = 'no-cache'
+
+
+class Asset:
+    """A static file held in memory together with its precompressed variants"""
+
+    def __init__(self, name, content):
+        self.name = name
+        self.mimetype = MIMETYPES[os.path.splitext(name)[1]]
+        self.etag = hashlib.sha256(content).hexdigest()[:16]
+        base, ext = os.path.splitext(name)
+        self.fingerprinted_name = f'{base}.{self.etag}{ext}'
+
+        # Keep a compressed variant only when it is actually smaller
+        self.encodings = {}
+        if brotli is not None:
+            compressed = brotli.compress(content, quality=11)
+            if len(compressed) < len(content):
+                self.encodings['br'] = compressed
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < len(content):
+            self.encodings['gzip'] = compressed
+        self.content = content
+
+    def response(self, cache_control):
+        encoding = self.select_encoding()
+        # Each encoding is a different representation, so it needs its own ETag
+        etag = f'{self.etag}-{encoding}' if encoding else self.etag
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            body = self.encodings[encoding] if encoding else self.content
+            response = app.response_class(body, mimetype=self.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def select_encoding(self):
+        """Pick the preferred encoding the client accepts (q > 0), or None"""
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = request.accept_encodings.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+
+def build_assets():
+    """Load, fingerprint and precompress the static assets (runs once at startup)"""
+    assets = {}
+    for name in ASSET_FILES:
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            assets[name] = Asset(name, f.read())
+
+    # env.js only depends on the environment, so it is rendered once as well
+    config = f"""const ENV = {{
+  API_URL: '{API_URL}',
+  SERVER_NUMBER: '{SERVER_NUMBER}'
+}};
+"""
+    assets['env.js'] = Asset('env.js', config.encode('utf-8'))
+    return assets
+
+
+ASSETS = build_assets()
+FINGERPRINTED_ASSETS = {asset.fingerprinted_name: asset for asset in ASSETS.values()}
+
+
+@app.context_processor
+def asset_helpers():
+    def asset_url(name):
+        return '/assets/' + ASSETS[name].fingerprinted_name
+    return {'asset_url': asset_url}
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -19,27 +115,29 @@ def index():
 def app_page():
     return render_template('app.html')
 
+@app.route('/assets/<filename>')
+def fingerprinted_asset(filename):
+    asset = FINGERPRINTED_ASSETS.get(filename)
+    if asset is None:
+        abort(404)
+    return asset.response(IMMUTABLE_CACHE)
+
 @app.route('/env.js')
 def env_config():
-    """Dynamically generate env.js from environment variables"""
-    config = f"""const ENV = {{
-  API_URL: '{API_URL}',
-  SERVER_NUMBER: '{SERVER_NUMBER}'
-}};
-"""
-    return app.response_class(config, mimetype='application/javascript')
+    """Serve env.js rendered at startup from environment variables"""
+    return ASSETS['env.js'].response(REVALIDATE_CACHE)
 
 @app.route('/styles.css')
 def styles():
-    return send_from_directory('static', 'styles.css')
+    return ASSETS['styles.css'].response(REVALIDATE_CACHE)
 
 @app.route('/auth.js')
 def auth_js():
-    return send_from_directory('static', 'auth.js')
+    return ASSETS['auth.js'].response(REVALIDATE_CACHE)
 
 @app.route('/app.js')
 def app_js():
-    return send_from_directory('static', 'app.js')
+    return ASSETS['app.js'].response(REVALIDATE_CACHE)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=80, debug=False)
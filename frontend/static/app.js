@@ -15,7 +15,21 @@ try {
 document.getElementById('serverNumber').textContent = ENV.SERVER_NUMBER;
 
 let currentFilter = 'all';
-let todos = [];
+let todos = [];            // Loaded todos in list order
+let nextCursor = null;     // Cursor of the next page, null when everything is loaded
+let loadingPage = false;
+let listGeneration = 0;    // Bumped on reload so pages of an old filter are dropped
+
+// The list only has DOM nodes for the rows in view (plus OVERSCAN rows on
+// each side). Every row has the same height, so a row's position follows
+// from its index and the spacer's height gives the scrollbar its full size.
+const PAGE_SIZE = 50;
+const ROW_HEIGHT = 190;    // Must match .todo-item height + 15px gap in styles.css
+const OVERSCAN = 5;
+
+const todoList = document.getElementById('todoList');
+const todoSpacer = document.getElementById('todoSpacer');
+const rows = new Map();    // todo id -> row element currently in the DOM
 
 // Check authentication
 if (!authToken) {
@@ -34,78 +48,311 @@ function logout() {
     window.location.href = 'index.html';
 }
 
-// Fetch all todos
-async function fetchTodos() {
+// Reload the list from the first page
+function fetchTodos() {
+    listGeneration++;
+    loadingPage = false;
+    todos = [];
+    nextCursor = null;
+    rows.forEach(removeRow);
+    rows.clear();
+    todoSpacer.style.height = '0px';
+    todoList.scrollTop = 0;
+    return loadNextPage();
+}
+
+// Fetch the next page of todos
+async function loadNextPage() {
+    if (loadingPage) {
+        return;
+    }
+    loadingPage = true;
+    const generation = listGeneration;
+    let loaded = false;
+    let retryScheduled = false;
+    
     try {
-        let url = `${ENV.API_URL}/todos`;
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
         if (currentFilter !== 'all') {
-            url += `?status=${currentFilter}`;
+            params.set('status', currentFilter);
+        }
+        if (nextCursor) {
+            params.set('cursor', nextCursor);
         }
         
-        const response = await fetch(url, {
+        const response = await fetch(`${ENV.API_URL}/todos?${params}`, {
             headers: {
                 'Authorization': `Bearer ${authToken}`
             }
         });
         
+        if (generation !== listGeneration) {
+            return;
+        }
+        
         if (response.ok) {
             const data = await response.json();
-            todos = data.todos || [];
-            renderTodos();
+            if (generation !== listGeneration) {
+                return;
+            }
+            todos.push(...(data.todos || []));
+            nextCursor = data.nextCursor || null;
+            loaded = true;
+        } else if (response.status === 429 || response.status === 503) {
+            // Rate limited or busy: hold further page loads until Retry-After has passed
+            const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 1;
+            retryScheduled = true;
+            setTimeout(() => {
+                if (generation === listGeneration) {
+                    loadingPage = false;
+                    loadNextPage();
+                }
+            }, retryAfter * 1000);
         } else if (response.status === 401) {
             logout();
         }
     } catch (error) {
+        // The next scroll retries
         console.error('Error fetching todos:', error);
+    } finally {
+        if (generation === listGeneration && !retryScheduled) {
+            // Reset before rendering, which may start the next page load
+            loadingPage = false;
+            if (loaded) {
+                renderTodos();
+            }
+        }
     }
 }
 
-// Render todos
+// Render the rows in view, reusing the ones already in the DOM
 function renderTodos() {
-    const todoList = document.getElementById('todoList');
     const emptyState = document.getElementById('emptyState');
+    emptyState.style.display = todos.length === 0 && !nextCursor ? 'block' : 'none';
+    todoSpacer.style.height = `${todos.length * ROW_HEIGHT}px`;
     
-    if (todos.length === 0) {
-        todoList.innerHTML = '';
-        emptyState.style.display = 'block';
-        return;
+    const first = Math.max(0, Math.floor(todoList.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const last = Math.min(todos.length, Math.ceil((todoList.scrollTop + todoList.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+    
+    const visible = new Set();
+    for (let index = first; index < last; index++) {
+        const todo = todos[index];
+        visible.add(todo.id);
+        
+        let row = rows.get(todo.id);
+        if (!row) {
+            row = createRow(todo);
+            rows.set(todo.id, row);
+            todoSpacer.appendChild(row);
+        }
+        
+        const transform = `translateY(${index * ROW_HEIGHT}px)`;
+        if (row.style.transform !== transform) {
+            row.style.transform = transform;
+        }
     }
     
-    emptyState.style.display = 'none';
+    rows.forEach((row, id) => {
+        if (!visible.has(id)) {
+            removeRow(row);
+            rows.delete(id);
+        }
+    });
     
-    todoList.innerHTML = todos.map(todo => `
-        <div class="todo-item ${todo.completed ? 'completed' : ''}">
-            <div class="todo-header">
-                <input type="checkbox" 
-                       class="todo-checkbox" 
-                       ${todo.completed ? 'checked' : ''} 
-                       onchange="toggleTodo('${todo.id}', ${!todo.completed})">
-                <div class="todo-media-container">
-                    ${todo.imageUrl ? 
-                      `<img src="${todo.imageUrl}" alt="Todo Image" class="todo-image" onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">` :
-                      `<button class="todo-media-placeholder" onclick="uploadMediaToTodo('${todo.id}')">
-                         <span class="media-icon">📷</span>
-                       </button>`
-                    }
-                </div>
-                <div class="todo-content">
-                    <div class="todo-title">${escapeHtml(todo.title)}</div>
-                    <div class="todo-actions">
-                        <button class="btn-delete" onclick="deleteTodo('${todo.id}')">Delete</button>
-                    </div>
+    // Fetch more before the user reaches the end of what is loaded
+    if (nextCursor && !loadingPage && last >= todos.length - OVERSCAN) {
+        loadNextPage();
+    }
+}
+
+// Re-render at most once per frame while scrolling
+let renderScheduled = false;
+function scheduleRender() {
+    if (renderScheduled) {
+        return;
+    }
+    renderScheduled = true;
+    requestAnimationFrame(() => {
+        renderScheduled = false;
+        renderTodos();
+    });
+}
+
+todoList.addEventListener('scroll', scheduleRender, { passive: true });
+window.addEventListener('resize', scheduleRender);
+
+// Static row markup; user data is only ever set through textContent
+const rowTemplate = document.createElement('template');
+rowTemplate.innerHTML = `
+    <div class="todo-item">
+        <div class="todo-header">
+            <input type="checkbox" class="todo-checkbox">
+            <div class="todo-media-container"></div>
+            <div class="todo-content">
+                <div class="todo-title"></div>
+                <div class="todo-actions">
+                    <button class="btn-delete" data-action="delete">Delete</button>
                 </div>
             </div>
-            ${todo.description ? `<div class="todo-description">${escapeHtml(todo.description)}</div>` : ''}
-            <div class="todo-date">Created: ${formatDate(todo.createdAt)}</div>
         </div>
-    `).join('');
+        <div class="todo-description"></div>
+        <div class="todo-date"></div>
+    </div>
+`.trim();
+
+function createRow(todo) {
+    const row = rowTemplate.content.firstElementChild.cloneNode(true);
+    row.dataset.id = todo.id;
+    updateRow(row, todo);
+    return row;
 }
 
-// Escape HTML to prevent XSS
-function escapeHtml(text) {
-    const div = document.createElement('div');
-    div.textContent = text;
-    return div.innerHTML;
+// Bring an existing row up to date, touching only what changed
+function updateRow(row, todo) {
+    row.classList.toggle('completed', todo.completed);
+    row.querySelector('.todo-checkbox').checked = todo.completed;
+    
+    const title = row.querySelector('.todo-title');
+    if (title.textContent !== todo.title) {
+        title.textContent = todo.title;
+    }
+    
+    const description = row.querySelector('.todo-description');
+    if (description.textContent !== (todo.description || '')) {
+        description.textContent = todo.description || '';
+    }
+    description.style.display = todo.description ? '' : 'none';
+    
+    const date = `Created: ${formatDate(todo.createdAt)}`;
+    const dateElement = row.querySelector('.todo-date');
+    if (dateElement.textContent !== date) {
+        dateElement.textContent = date;
+    }
+    
+    // Only replace the media when the image changed, so it isn't reloaded
+    const imageUrl = todo.imageUrl || '';
+    if (row.dataset.imageUrl !== imageUrl) {
+        row.dataset.imageUrl = imageUrl;
+        const media = row.querySelector('.todo-media-container');
+        unobserveImages(media);
+        media.replaceChildren(imageUrl ? createImage(imageUrl) : createPlaceholder());
+    }
+}
+
+function removeRow(row) {
+    unobserveImages(row);
+    row.remove();
+}
+
+function createPlaceholder() {
+    const button = document.createElement('button');
+    button.className = 'todo-media-placeholder';
+    button.dataset.action = 'upload';
+    const icon = document.createElement('span');
+    icon.className = 'media-icon';
+    icon.textContent = '📷';
+    button.appendChild(icon);
+    return button;
+}
+
+// Images start loading when their row scrolls near the viewport
+const imageObserver = 'IntersectionObserver' in window
+    ? new IntersectionObserver(loadVisibleImages, { root: todoList, rootMargin: '200px 0px' })
+    : null;
+
+function loadVisibleImages(entries) {
+    entries.forEach(entry => {
+        if (entry.isIntersecting) {
+            const image = entry.target;
+            imageObserver.unobserve(image);
+            image.src = image.dataset.src;
+        }
+    });
+}
+
+function createImage(url) {
+    const image = document.createElement('img');
+    image.className = 'todo-image';
+    image.alt = 'Todo Image';
+    image.loading = 'lazy';
+    image.decoding = 'async';
+    image.addEventListener('error', () => image.replaceWith(createPlaceholder()), { once: true });
+    if (imageObserver) {
+        image.dataset.src = url;
+        imageObserver.observe(image);
+    } else {
+        image.src = url;
+    }
+    return image;
+}
+
+function unobserveImages(element) {
+    if (imageObserver) {
+        element.querySelectorAll('img[data-src]').forEach(image => imageObserver.unobserve(image));
+    }
+}
+
+// One set of listeners for all rows
+todoList.addEventListener('change', (e) => {
+    if (e.target.classList.contains('todo-checkbox')) {
+        const row = e.target.closest('.todo-item');
+        toggleTodo(row.dataset.id, e.target.checked);
+    }
+});
+
+todoList.addEventListener('click', (e) => {
+    const button = e.target.closest('[data-action]');
+    if (!button) {
+        return;
+    }
+    const id = button.closest('.todo-item').dataset.id;
+    if (button.dataset.action === 'delete') {
+        deleteTodo(id);
+    } else if (button.dataset.action === 'upload') {
+        uploadMediaToTodo(id);
+    }
+});
+
+function matchesFilter(todo) {
+    if (currentFilter === 'completed') {
+        return todo.completed;
+    }
+    if (currentFilter === 'pending') {
+        return !todo.completed;
+    }
+    return true;
+}
+
+// Apply a todo returned by the API to the list and to its row
+function patchTodo(todo) {
+    const index = todos.findIndex(item => item.id === todo.id);
+    if (index === -1) {
+        return;
+    }
+    
+    if (!matchesFilter(todo)) {
+        removeTodo(todo.id);
+        return;
+    }
+    
+    todos[index] = todo;
+    const row = rows.get(todo.id);
+    if (row) {
+        updateRow(row, todo);
+    }
+}
+
+function removeTodo(id) {
+    const index = todos.findIndex(item => item.id === id);
+    if (index !== -1) {
+        todos.splice(index, 1);
+    }
+    const row = rows.get(id);
+    if (row) {
+        removeRow(row);
+        rows.delete(id);
+    }
+    renderTodos();
 }
 
 // Format date
@@ -176,7 +423,13 @@ document.getElementById('addTodoForm').addEventListener('submit', async (e) => {
             document.getElementById('todoDescription').value = '';
             document.getElementById('todoImage').value = '';
             document.getElementById('fileNameDisplay').textContent = '';
-            await fetchTodos();
+            
+            // Newest todos come first
+            const todo = await response.json();
+            if (matchesFilter(todo)) {
+                todos.unshift(todo);
+                renderTodos();
+            }
         } else if (response.status === 401) {
             logout();
         } else {
@@ -203,13 +456,21 @@ async function toggleTodo(id, completed) {
         });
         
         if (response.ok) {
-            await fetchTodos();
+            patchTodo(await response.json());
+            return;
         } else if (response.status === 401) {
             logout();
         }
     } catch (error) {
         console.error('Error updating todo:', error);
     }
+    
+    // Put the checkbox back to the last known state
+    const todo = todos.find(item => item.id === id);
+    const row = rows.get(id);
+    if (todo && row) {
+        updateRow(row, todo);
+    }
 }
 
 // Upload media to existing todo
@@ -245,7 +506,7 @@ async function uploadMediaToTodo(id) {
             });
             
             if (response.ok) {
-                await fetchTodos(); // Refresh the todo list
+                patchTodo(await response.json());
             } else if (response.status === 401) {
                 logout();
             } else {
@@ -278,7 +539,7 @@ async function deleteTodo(id) {
         });
         
         if (response.ok || response.status === 204) {
-            await fetchTodos();
+            removeTodo(id);
         } else if (response.status === 401) {
             logout();
         }